@@ -1,8 +1,7 @@
 import os
 import subprocess
 import streamlit as st
-from views import poll, current, history, debts, morosos, statistics
-from utils import load_users, load_settleup, save_csv
+from utils import load_users, load_settleup, save_csv, migrate_history, session_files
 import time
 
 
@@ -14,6 +13,9 @@ HISTORY_DIR = "history"
 os.makedirs(HISTORY_DIR, exist_ok=True)
 LST_FILE = os.path.join(HISTORY_DIR, "last.csv")  # Last debts
 
+# Backstories generated by the pix2pix project (override with BACKSTORIES_DIR, e.g. to point at a local fixture)
+BACKSTORIES_DIR = os.environ.get("BACKSTORIES_DIR", "/home/mrt/Projects/pix2pix/backstories")
+
 # Tmp directory
 TMP_DIR = "tmp"
 os.makedirs(TMP_DIR, exist_ok=True)
@@ -22,6 +24,16 @@ ORD_FILE = os.path.join(TMP_DIR, "order.csv")  # The order
 BAR_FILE = os.path.join(TMP_DIR, "bar.csv")  # What to ask at the bar
 MAC_FILE = os.path.join(TMP_DIR, "machine.csv")  # What to put in the paying machine
 DEB_FILE = os.path.join(TMP_DIR, "debts.csv")  # Debts per user
+ASSET_CACHE_DIR = os.path.join(TMP_DIR, "asset_cache")  # Downscaled images and compressed audio of the Morosos view
+
+
+# Bring history directories that are not in the store yet, once per server process (the views only read the store)
+@st.cache_resource
+def migrate_once(history_dir, files):
+    return migrate_history(history_dir, files)
+
+
+migrate_once(HISTORY_DIR, session_files(WHO_FILE, ORD_FILE, BAR_FILE, MAC_FILE, DEB_FILE))
 
 # Initialize session state
 if "state" not in st.session_state:
@@ -66,30 +78,43 @@ if st.session_state.collapse_stage == 1:
 if st.session_state.collapse_stage == 2:
     st.session_state.collapse_stage = 0  # back to “idle”
 
+# Only the selected view is imported
 match menu:
     # Poll view to create an order
     case "Poll ☕":
+        from views.poll import poll
+
         poll(ORD_FILE, USERS_FILE, LST_FILE)
 
     # Current view to display the current order
     case "Current 💥":
+        from views.current import current
+
         current(HISTORY_DIR, WHO_FILE, ORD_FILE, BAR_FILE, MAC_FILE, DEB_FILE, LST_FILE)
 
     # Debts view to check debts
     case "Debts 💲":
+        from views.debts import debts
+
         debts(USERS_FILE, LST_FILE)
 
     # History view to check past summaries
     case "History 📜":
+        from views.history import history
+
         history(HISTORY_DIR, WHO_FILE, ORD_FILE, BAR_FILE, MAC_FILE, DEB_FILE)
 
     # Statistics view to see analytics
     case "Statistics 📊":
+        from views.statistics import statistics
+
         statistics(HISTORY_DIR, WHO_FILE, ORD_FILE, BAR_FILE, MAC_FILE, DEB_FILE, USERS_FILE)
 
     # Morosos view to see the stories of everyone
     case "Morosos 👻":
-        morosos(LST_FILE)
+        from views.morosos import morosos
+
+        morosos(LST_FILE, BACKSTORIES_DIR, ASSET_CACHE_DIR)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import shutil
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import statistics
+import pandas as pd
+from benchmarks.synthetic import generate_history, menu_from_pricing, random_order
+from utils import load_pricing, load_history_sessions, load_history_session, load_statistics, ticket_logic, update_debts, save_order, save_csv, save_whopaid, migrate_history, load_balances, ledger_paths
+from utils import history_store, statistics_utils
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# (users, sessions) per scale
+SCALES = {
+    "small": (20, 100),
+    "medium": (40, 1000),
+    "large": (60, 5000),
+}
+
+
+def measure(func, repeat, setup=None):
+    """Run func `repeat` times and return (median seconds, min seconds, peak MiB of one traced run). setup runs untimed before each run."""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return statistics.median(timings), min(timings), peak / 2**20
+
+
+def frames_memory(data):
+    """MiB held by the statistics frames (orders, debts and sessions, without the rollups)."""
+    return sum(df.memory_usage(deep=True).sum() for df in (data.orders, data.debts, data.sessions)) / 2**20
+
+
+def run_scale(name, num_users, num_sessions, repeat, root):
+    """Generate a history for one scale and time the hot paths against it."""
+    history_dir = os.path.join(root, name, "history")
+    tmp_dir = os.path.join(root, name, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    files = {f: os.path.join(tmp_dir, f) for f in ["whopaid.txt", "order.csv", "bar.csv", "machine.csv", "debts.csv"]}
+    args = (history_dir, files["whopaid.txt"], files["order.csv"], files["bar.csv"], files["machine.csv"], files["debts.csv"])
+    last_file = os.path.join(history_dir, "last.csv")
+
+    print(f"[{name}] generating {num_sessions} sessions for {num_users} users...", file=sys.stderr)
+    users = generate_history(history_dir, num_users, num_sessions)
+
+    # Large synthetic orders for the ticket and vote benchmarks
+    rng = random.Random(1)
+    drinks, foods = menu_from_pricing(load_pricing())
+    order = random_order(rng, users, drinks, foods, min_people=len(users), max_people=len(users))
+    bar_ticket, machine_ticket, debts_ticket = ticket_logic(order)
+    save_csv(debts_ticket, files["debts.csv"])
+    save_whopaid(files["whopaid.txt"], debts_ticket["Name"].iloc[0], debts_ticket["Debt"].astype(float).sum())
+    vote = order.iloc[[0]].copy()
+
+    def cold(func):
+        # Drop the in-process caches so that every run reads from disk
+        def run():
+            history_store._table_cache.clear()
+            statistics_utils._statistics_cache.clear()
+            func()
+        return run
+
+    def migrate():
+        # Convert the whole tree every time
+        shutil.rmtree(os.path.join(history_dir, history_store.STORE_DIR), ignore_errors=True)
+        history_store._table_cache.clear()
+        migrate_history(history_dir)
+
+    def reset_ledger():
+        # update_debts appends to the ledger, every run starts from the same copy of it
+        shutil.copy(ledger_fixture, ledger_file)
+        shutil.rmtree(snapshot_dir)
+        shutil.copytree(snapshot_fixture, snapshot_dir, copy_function=shutil.copy)
+
+    cases = {}
+    cases["migrate_history"] = measure(migrate, 1)
+    cases["load_history_sessions"] = measure(cold(lambda: load_history_sessions(*args)), repeat)
+    newest = load_history_sessions(*args)["Session"].iloc[0]
+    cases["load_history_session"] = measure(lambda: load_history_session(history_dir, newest, *args[1:]), repeat)
+    cases["load_statistics"] = measure(cold(lambda: load_statistics(*args)), repeat)
+    cases["load_statistics_cached"] = measure(lambda: load_statistics(*args), repeat)
+    cases["ticket_logic"] = measure(lambda: ticket_logic(order), repeat)
+
+    # Ledger seeded from last.csv (after the migration, which rebuilds the store directory)
+    load_balances(last_file)
+    ledger_file, snapshot_dir = ledger_paths(last_file)
+    ledger_fixture, snapshot_fixture = os.path.join(root, name, "ledger.csv"), os.path.join(root, name, "balances")
+    shutil.copy(ledger_file, ledger_fixture)
+    shutil.copytree(snapshot_dir, snapshot_fixture)
+    cases["update_debts"] = measure(lambda: update_debts(files["whopaid.txt"], files["debts.csv"], last_file), repeat, reset_ledger)
+    cases["save_order"] = measure(lambda: save_order(vote.copy(), files["order.csv"]), repeat)
+
+    results = {case: {"median_s": median, "min_s": minimum, "peak_mib": peak} for case, (median, minimum, peak) in cases.items()}
+    results["load_statistics"]["frames_mib"] = frames_memory(load_statistics(*args))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return the (scale, case, baseline, current) entries that got slower than tolerance x baseline."""
+    regressions = []
+    for scale, cases in results.items():
+        for case, current in cases.items():
+            previous = baseline.get("results", {}).get(scale, {}).get(case)
+            if previous and current["median_s"] > tolerance * previous["median_s"]:
+                regressions.append((scale, case, previous["median_s"], current["median_s"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app's hot paths on synthetic histories.")
+    parser.add_argument("--scales", default="small,medium", help=f"Comma separated scales among {', '.join(SCALES)} (default: small,medium)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case (default: 5)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline file to compare against / save to")
+    parser.add_argument("--save-baseline", action="store_true", help="Save these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="Slowdown factor reported as a regression (default: 1.5)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        for scale in args.scales.split(","):
+            num_users, num_sessions = SCALES[scale]
+            results[scale] = run_scale(scale, num_users, num_sessions, args.repeat, root)
+
+    # Report
+    print(f"{'scale':<8} {'case':<22} {'median ms':>10} {'min ms':>10} {'peak MiB':>10}")
+    for scale, cases in results.items():
+        for case, r in cases.items():
+            print(f"{scale:<8} {case:<22} {r['median_s'] * 1000:>10.2f} {r['min_s'] * 1000:>10.2f} {r['peak_mib']:>10.2f}")
+    for scale, cases in results.items():
+        print(f"{scale:<8} statistics frames: {cases['load_statistics']['frames_mib']:.2f} MiB")
+
+    if args.save_baseline:
+        baseline = {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "results": results,
+        }
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for scale, case, previous, current in regressions:
+            print(f"REGRESSION {scale}/{case}: {previous * 1000:.2f} ms -> {current * 1000:.2f} ms")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance x{args.tolerance})")
+
+
+if __name__ == "__main__":
+    main()
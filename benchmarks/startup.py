@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+
+APP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+MENU = ["Poll ☕", "Current 💥", "Debts 💲", "History 📜", "Statistics 📊", "Morosos 👻"]
+
+# Run in a fresh interpreter: the first script run of the app on one menu entry, after importing Streamlit.
+# With "eager", every view module is imported first, like the router used to do.
+FIRST_RUN = """
+import sys, json, time, importlib
+from streamlit.testing.v1 import AppTest
+
+app_file, menu, eager = sys.argv[1], sys.argv[2], sys.argv[3] == "1"
+with open(app_file, encoding="utf-8") as f:
+    # Without the block that launches the Streamlit server
+    source = f.read().split('if __name__ == "__main__":')[0]
+at = AppTest.from_string(source, default_timeout=120)
+at.session_state["menu"] = menu
+
+modules = len(sys.modules)
+start = time.perf_counter()
+if eager:
+    for view in ["poll", "debts", "current", "history", "morosos", "statistics"]:
+        importlib.import_module(f"views.{view}")
+at.run()
+elapsed = time.perf_counter() - start
+
+print(json.dumps({"seconds": elapsed, "modules": len(sys.modules) - modules, "exceptions": len(at.exception), "plotly": "plotly.express" in sys.modules}))
+"""
+
+
+def first_run(app_file, menu, eager, work_dir):
+    """First run of app_file on menu in a new process: seconds, modules it imported, exceptions and whether it loaded plotly.express."""
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(app_file))
+    out = subprocess.run(
+        [sys.executable, "-c", FIRST_RUN, app_file, menu, "1" if eager else "0"],
+        cwd=work_dir,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the cold start of app.py (first run in a new process) per menu entry.")
+    parser.add_argument("--app", default=APP_FILE, help="App to time (default: this checkout's app.py)")
+    parser.add_argument("--repeat", type=int, default=5, help="Processes per menu entry (default: 5)")
+    parser.add_argument("--menu", nargs="*", default=MENU, help="Menu entries to time (default: all)")
+    args = parser.parse_args()
+
+    app_file = os.path.abspath(args.app)
+    with tempfile.TemporaryDirectory() as work_dir:
+        # The app reads inputs/ and writes history/ and tmp/ relative to its working directory
+        os.symlink(os.path.join(os.path.dirname(app_file), "inputs"), os.path.join(work_dir, "inputs"))
+
+        print(f"{'view':<14} {'eager ms':>10} {'lazy ms':>10} {'eager min':>10} {'lazy min':>10} {'eager mods':>11} {'lazy mods':>10} {'plotly':>7}")
+        for menu in args.menu:
+            row = {}
+            for eager in (True, False):
+                runs = [first_run(app_file, menu, eager, work_dir) for _ in range(args.repeat)]
+                if any(run["exceptions"] for run in runs):
+                    print(f"{menu}: the app raised an exception", file=sys.stderr)
+                seconds = [run["seconds"] for run in runs]
+                row[eager] = (statistics.median(seconds) * 1000, min(seconds) * 1000, runs[-1]["modules"], runs[-1]["plotly"])
+
+            (eager_median, eager_min, eager_modules, _), (lazy_median, lazy_min, lazy_modules, plotly) = row[True], row[False]
+            print(f"{menu:<14} {eager_median:>10.1f} {lazy_median:>10.1f} {eager_min:>10.1f} {lazy_min:>10.1f} {eager_modules:>11} {lazy_modules:>10} {'yes' if plotly else 'no':>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import os
+import math
+import wave
+import random
+import argparse
+import pandas as pd
+from datetime import datetime, timedelta
+from utils import load_pricing, ticket_logic, save_csv, save_whopaid, ASSET_FILES
+
+
+# Categories that are ordered as drinks (everything else in pricing.yaml is food)
+DRINK_CATEGORIES = ["Café", "Infusión", "Colacao"]
+
+# Rough shape of a real breakfast: most people drink coffee, about half of them eat something
+DRINK_WEIGHTS = {"Café": 0.75, "Infusión": 0.12, "Colacao": 0.05, "Nada": 0.08}
+FOOD_PROBABILITY = 0.55
+
+
+def menu_from_pricing(pricing):
+    """Split the items of pricing.yaml into drinks and foods."""
+    drinks, foods = {}, []
+    for item, (_, category) in pricing.items.items():
+        if item == "Nada":
+            continue
+        if category in DRINK_CATEGORIES:
+            drinks.setdefault(category, []).append(item)
+        else:
+            foods.append(item)
+    return drinks, foods
+
+
+def random_order(rng, users, drinks, foods, min_people=3, max_people=15):
+    """A random order: a subset of the users, each with one drink and one food (either can be "Nada")."""
+    people = rng.sample(users, rng.randint(min_people, min(max_people, len(users))))
+    drink_categories = list(DRINK_WEIGHTS.keys())
+    weights = list(DRINK_WEIGHTS.values())
+
+    rows = []
+    for name in people:
+        category = rng.choices(drink_categories, weights)[0]
+        drink = "Nada" if category == "Nada" else rng.choice(drinks[category])
+        food = rng.choice(foods) if rng.random() < FOOD_PROBABILITY else "Nada"
+        if drink == "Nada" and food == "Nada":
+            drink = rng.choice(drinks["Café"])
+        rows.append({"Name": name, "Drinks": drink, "Food": food})
+    return pd.DataFrame(rows, columns=["Name", "Drinks", "Food"])
+
+
+def generate_history(history_dir, num_users, num_sessions, seed=0, start=datetime(2022, 1, 3, 10, 30)):
+    """
+    Write a synthetic history in the app's layout: one history/<timestamp>/ directory per session
+    (whopaid.txt, order.csv, bar.csv, machine.csv, debts.csv) and history/last.csv with the final balances.
+    """
+    rng = random.Random(seed)
+    pricing = load_pricing()
+    drinks, foods = menu_from_pricing(pricing)
+    users = [f"User {i:03d}" for i in range(num_users)]
+    balances = {user: 0.0 for user in users}
+
+    os.makedirs(history_dir, exist_ok=True)
+    day = start
+    for _ in range(num_sessions):
+        # One session per working day
+        while day.weekday() >= 5:
+            day += timedelta(days=1)
+        timestamp = (day + timedelta(seconds=rng.randint(0, 1800))).strftime("%Y-%m-%d_%H-%M-%S")
+        day += timedelta(days=1)
+
+        order = random_order(rng, users, drinks, foods)
+        bar_ticket, machine_ticket, debts_ticket = ticket_logic(order)
+        debts = debts_ticket["Debt"].astype(float)
+        total = round(float(debts.sum()), 2)
+        whopaid = rng.choice(debts_ticket["Name"].tolist())
+
+        # Accumulated debts of every user after this session (a full snapshot, like save_history writes)
+        for name, debt in zip(debts_ticket["Name"], debts):
+            balances[name] += debt - (total if name == whopaid else 0.0)
+        session_balances = pd.DataFrame({"Name": users, "Debt": [round(balances[name], 2) for name in users]})
+
+        session_dir = os.path.join(history_dir, timestamp)
+        os.makedirs(session_dir, exist_ok=True)
+        save_whopaid(os.path.join(session_dir, "whopaid.txt"), whopaid, total)
+        save_csv(pd.merge(order, debts_ticket, on="Name", how="inner"), os.path.join(session_dir, "order.csv"))
+        save_csv(bar_ticket, os.path.join(session_dir, "bar.csv"))
+        save_csv(machine_ticket, os.path.join(session_dir, "machine.csv"))
+        save_csv(session_balances, os.path.join(session_dir, "debts.csv"))
+
+    save_csv(pd.DataFrame({"Name": users, "Debt": [round(balances[name], 2) for name in users]}), os.path.join(history_dir, "last.csv"))
+    return users
+
+
+def generate_backstories(backstories_dir, users, seed=0, missing_probability=0.1):
+    """
+    Write placeholder Morosos assets in the pix2pix layout: one <backstories_dir>/<user>/ directory per user
+    with nickname.txt, image.png, backstory.txt and speech.wav. Each asset is left out with missing_probability.
+    """
+    from PIL import Image
+
+    rng = random.Random(seed)
+    for user in users:
+        user_dir = os.path.join(backstories_dir, user)
+        os.makedirs(user_dir, exist_ok=True)
+        for asset, file_name in ASSET_FILES.items():
+            if rng.random() < missing_probability:
+                continue
+            path = os.path.join(user_dir, file_name)
+
+            if asset == "nickname":
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(f"The {rng.choice(['Shadow', 'Phantom', 'Baron', 'Duke'])} of {rng.choice(['Croissants', 'Espresso', 'Churros', 'Toast'])}")
+            elif asset == "backstory":
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(f"{user} has owed the breakfast fund since day {rng.randint(1, 999)}.")
+            elif asset == "image":
+                Image.new("RGB", (1024, 1024), tuple(rng.randrange(256) for _ in range(3))).save(path)
+            else:
+                # One second of a sine tone
+                rate, pitch = 16000, rng.randint(200, 800)
+                with wave.open(path, "wb") as f:
+                    f.setnchannels(1)
+                    f.setsampwidth(2)
+                    f.setframerate(rate)
+                    f.writeframes(b"".join(int(8000 * math.sin(2 * math.pi * pitch * t / rate)).to_bytes(2, "little", signed=True) for t in range(rate)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic breakfast history.")
+    parser.add_argument("history_dir", help="Directory to write the history to")
+    parser.add_argument("--users", type=int, default=30, help="Number of users (default: 30)")
+    parser.add_argument("--sessions", type=int, default=500, help="Number of sessions (default: 500)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--backstories", help="Also write placeholder Morosos assets for the users to this directory")
+    args = parser.parse_args()
+
+    users = generate_history(args.history_dir, args.users, args.sessions, args.seed)
+    print(f"Wrote {args.sessions} sessions for {args.users} users to {args.history_dir}")
+
+    if args.backstories:
+        generate_backstories(args.backstories, users, args.seed)
+        print(f"Wrote Morosos assets for {len(users)} users to {args.backstories}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,8 @@
 from .history_utils import *
 from .order_utils import *
 from .data_utils import *
+from .history_store import *
+from .debt_ledger import *
+from .user_registry import *
+from .statistics_utils import *
+from .asset_cache import *
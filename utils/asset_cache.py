@@ -0,0 +1,225 @@
+import os
+import time
+import shutil
+import hashlib
+import logging
+import threading
+import subprocess
+from collections import OrderedDict
+
+
+# Size bound of the cache of downscaled images and compressed audio (its directory is chosen by the app)
+ASSET_CACHE_MAX_BYTES = 200 * 2**20
+
+# Width of the main Streamlit column, images are never shown wider than this
+THUMBNAIL_WIDTH = 736
+THUMBNAIL_QUALITY = 80
+
+# Speech only needs a low bitrate
+AUDIO_BITRATE = "32k"
+
+# Files the pix2pix project writes for each user, the text ones are read into the manifest
+ASSET_FILES = {"nickname": "nickname.txt", "image": "image.png", "backstory": "backstory.txt", "speech": "speech.wav"}
+TEXT_ASSETS = ["nickname", "backstory"]
+
+# Entries of each cache directory, least recently used first ({path: size}), and their total size.
+# Read from disk once per process, then kept up to date on every hit, write and eviction
+_cache_index = {}
+_cache_index_lock = threading.Lock()
+
+# Manifest of each assets root, with the directory mtimes it was built from and when it was built.
+# Files rewritten in place do not change their directory, they are picked up after MANIFEST_TTL seconds
+MANIFEST_TTL = 300
+_manifest_cache = {}
+_manifest_lock = threading.Lock()
+
+
+def _cached_path(source, variant, extension, cache_dir):
+    """Cache entry of a source file: named after its absolute path, mtime, size and the conversion applied."""
+    stat = os.stat(source)
+    key = f"{os.path.abspath(source)}|{stat.st_mtime_ns}|{stat.st_size}|{variant}"
+    return os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest() + extension)
+
+
+def _load_index(cache_dir):
+    """Index of a cache directory, scanned on first use (callers hold _cache_index_lock)."""
+    index = _cache_index.get(cache_dir)
+    if index is None:
+        files = []
+        if os.path.isdir(cache_dir):
+            with os.scandir(cache_dir) as entries:
+                files = [(entry.stat().st_mtime_ns, entry.path, entry.stat().st_size) for entry in entries if entry.is_file() and not entry.name.endswith(".tmp")]
+        entries = OrderedDict((path, size) for _, path, size in sorted(files))
+        index = _cache_index[cache_dir] = {"entries": entries, "bytes": sum(entries.values())}
+    return index
+
+
+def _hit(path, cache_dir):
+    """Return True if the entry exists, marking it as recently used."""
+    try:
+        os.utime(path)  # Keeps the order for the next process
+    except FileNotFoundError:
+        return False
+
+    with _cache_index_lock:
+        index = _load_index(cache_dir)
+        if path in index["entries"]:
+            index["entries"].move_to_end(path)
+        else:
+            # Written by another process
+            size = os.path.getsize(path)
+            index["entries"][path] = size
+            index["bytes"] += size
+    return True
+
+
+def _add(path, cache_dir, max_bytes):
+    """Count a new entry in the cache size and evict the least recently used ones if it no longer fits."""
+    size = os.path.getsize(path)
+    with _cache_index_lock:
+        index = _load_index(cache_dir)
+        index["bytes"] -= index["entries"].pop(path, 0)
+
+    # Make room first, so that the new entry itself is never evicted
+    evict_assets(cache_dir, max_bytes - size)
+    with _cache_index_lock:
+        index["entries"][path] = size
+        index["bytes"] += size
+
+
+def _tmp_path(path):
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def evict_assets(cache_dir, max_bytes=ASSET_CACHE_MAX_BYTES):
+    """Remove the least recently used entries until the cache fits in max_bytes. Returns the number of removed files."""
+    removed = 0
+    with _cache_index_lock:
+        index = _load_index(cache_dir)
+        while index["bytes"] > max_bytes and index["entries"]:
+            path, size = index["entries"].popitem(last=False)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            index["bytes"] -= size
+            removed += 1
+    return removed
+
+
+def image_thumbnail(source, cache_dir, width=THUMBNAIL_WIDTH, max_bytes=ASSET_CACHE_MAX_BYTES):
+    """Path of a WebP copy of the image scaled down to width, made on first access. Falls back to the source on errors."""
+    try:
+        target = _cached_path(source, f"webp-{width}-{THUMBNAIL_QUALITY}", ".webp", cache_dir)
+        if _hit(target, cache_dir):
+            return target
+
+        from PIL import Image
+
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = _tmp_path(target)
+        with Image.open(source) as image:
+            image.thumbnail((width, image.height))
+            image.save(tmp, "WEBP", quality=THUMBNAIL_QUALITY)
+        os.replace(tmp, target)
+    except Exception as e:
+        logging.warning(f"Could not make a thumbnail of {source}: {e}")
+        return source
+
+    _add(target, cache_dir, max_bytes)
+    return target
+
+
+def compressed_audio(source, cache_dir, bitrate=AUDIO_BITRATE, max_bytes=ASSET_CACHE_MAX_BYTES):
+    """
+    (path, mime type) of an Opus copy of the audio, made with ffmpeg on first access.
+    Falls back to the source (as WAV) when ffmpeg is not installed or fails.
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return source, "audio/wav"
+
+    try:
+        target = _cached_path(source, f"opus-{bitrate}", ".ogg", cache_dir)
+        if _hit(target, cache_dir):
+            return target, "audio/ogg"
+
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = _tmp_path(target)
+        subprocess.run(
+            [ffmpeg, "-y", "-loglevel", "error", "-i", source, "-c:a", "libopus", "-b:a", bitrate, "-f", "ogg", tmp],
+            check=True,
+            capture_output=True,
+        )
+        os.replace(tmp, target)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logging.warning(f"Could not compress {source}: {e}")
+        return source, "audio/wav"
+
+    _add(target, cache_dir, max_bytes)
+    return target, "audio/ogg"
+
+
+def _manifest_version(root):
+    """User directories under root and their mtimes: they change when a user or an asset file is added, removed or replaced by a rename."""
+    try:
+        with os.scandir(root) as entries:
+            user_dirs = sorted((entry.name, entry.stat().st_mtime_ns) for entry in entries if entry.is_dir())
+        return tuple(user_dirs)
+    except FileNotFoundError:
+        return None
+
+
+def scan_assets(root):
+    """
+    Manifest of the assets under root: {user: {"nickname", "image", "backstory", "speech", "mtimes"}}.
+    Text assets hold their content, image and speech their path, and missing assets are None.
+    """
+    manifest = {}
+    try:
+        with os.scandir(root) as entries:
+            user_dirs = [(entry.name, entry.path) for entry in entries if entry.is_dir()]
+    except FileNotFoundError:
+        return manifest
+
+    for user, user_dir in user_dirs:
+        with os.scandir(user_dir) as entries:
+            files = {entry.name: entry for entry in entries if entry.is_file()}
+
+        assets = {asset: None for asset in ASSET_FILES}
+        assets["mtimes"] = {}
+        for asset, file_name in ASSET_FILES.items():
+            entry = files.get(file_name)
+            if entry is None:
+                continue
+            assets["mtimes"][asset] = entry.stat().st_mtime_ns
+
+            if asset not in TEXT_ASSETS:
+                assets[asset] = entry.path
+                continue
+            try:
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    assets[asset] = f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                logging.warning(f"Could not read {entry.path}: {e}")
+
+        manifest[user] = assets
+    return manifest
+
+
+def asset_manifest(root):
+    """Cached scan_assets(root), scanned again when a directory under root changes or the scan is older than MANIFEST_TTL."""
+    version = _manifest_version(root)
+    cached = _manifest_cache.get(root)
+    if cached is not None and cached[0] == version and time.monotonic() - cached[1] < MANIFEST_TTL:
+        return cached[2]
+
+    with _manifest_lock:
+        # Another thread may have scanned it in the meantime
+        cached = _manifest_cache.get(root)
+        if cached is not None and cached[0] == version and time.monotonic() - cached[1] < MANIFEST_TTL:
+            return cached[2]
+
+        manifest = scan_assets(root)
+        _manifest_cache[root] = (version, time.monotonic(), manifest)
+        return manifest
@@ -1,5 +1,8 @@
+import os
 import yaml
+import fcntl
 import pandas as pd
+from contextlib import contextmanager
 
 
 def load_csv(filename):
@@ -10,6 +13,26 @@ def save_csv(df, filename):
     df.to_csv(filename, index=False)
 
 
+def file_version(filename):
+    """Cheap change marker for a file: (mtime_ns, size), or None if it does not exist."""
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+@contextmanager
+def file_lock(filename, shared=False):
+    """Hold an advisory lock on a companion "<filename>.lock" file (exclusive unless shared)."""
+    with open(f"{filename}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
 def load_yaml(yaml_file):
     with open(yaml_file, "r", encoding="utf-8") as file:
         data = yaml.safe_load(file)
@@ -34,54 +57,6 @@ def load_descriptions(yaml_file):
     return pd.DataFrame(rows)
 
 
-def load_users(yaml_file):
-    data = load_yaml(yaml_file)
-    return list(data.keys())
-
-
-def load_active_users(yaml_file):
-    """Load only active users (not hidden) from the YAML file."""
-    data = load_yaml(yaml_file)
-    active_users = []
-    for user, value in data.items():
-        # Handle both old format (just a number) and new format (dict with status)
-        if isinstance(value, dict):
-            if value.get("status", "active") == "active":
-                active_users.append(user)
-        else:
-            # Old format - all users are active by default
-            active_users.append(user)
-    return active_users
-
-
-def load_hidden_users(yaml_file):
-    """Load only hidden users from the YAML file."""
-    data = load_yaml(yaml_file)
-    hidden_users = []
-    for user, value in data.items():
-        if isinstance(value, dict) and value.get("status") == "hidden":
-            hidden_users.append(user)
-    return hidden_users
-
-
-def toggle_user_status(yaml_file, user_name, new_status):
-    """Toggle a user's status between 'active' and 'hidden'."""
-    data = load_yaml(yaml_file)
-
-    if user_name not in data:
-        return False
-
-    # Convert old format to new format if needed
-    if not isinstance(data[user_name], dict):
-        data[user_name] = {"debt": data[user_name], "status": "active"}
-
-    # Update status
-    data[user_name]["status"] = new_status
-
-    save_yaml(data, yaml_file)
-    return True
-
-
 def save_users(users, users_file):
     sorted_users = sorted(users, key=lambda x: (x != "Invitado", x))
     with open(users_file, "w", encoding="utf-8") as f:
@@ -101,6 +76,9 @@ def save_whopaid(whopaid_file, whopaid, price):
 
 
 def add_user(yaml_file, new_user, new_debt, last_file):
+    # Imported here because the debt ledger itself depends on this module
+    from utils.debt_ledger import add_user_to_last
+
     # Load existing data from the YAML file
     data = load_yaml(yaml_file)
 
@@ -117,23 +95,3 @@ def add_user(yaml_file, new_user, new_debt, last_file):
     # Save the updated data back to the YAML file
     save_yaml(data, yaml_file)
     return True
-
-
-def add_user_to_last(last_file, new_user, new_debt):
-    # Load the existing CSV into a DataFrame
-    df = load_csv(last_file)
-
-    # Check if the user already exists
-    if new_user in df["Name"].values:
-        return False
-
-    # Add the new user
-    new_row = pd.DataFrame({"Name": [new_user], "Debt": [new_debt]})
-    df = pd.concat([df, new_row], ignore_index=True)
-
-    # Sort by the Name column alphabetically
-    df = df.sort_values(by="Name").reset_index(drop=True)
-
-    # Save the updated DataFrame back to the CSV
-    df.to_csv(last_file, index=False)
-    return True
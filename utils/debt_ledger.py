@@ -0,0 +1,161 @@
+import io
+import os
+import logging
+import pandas as pd
+from datetime import datetime
+from utils.data_utils import load_csv, file_version, file_lock
+from utils.history_store import STORE_DIR
+
+
+# Append-only ledger of per-session debt deltas, next to the history store
+LEDGER_FILE = "ledger.csv"
+LEDGER_COLUMNS = ["Session", "Name", "Debt"]
+
+# Compacted balances, named after the ledger offset (in bytes) they include
+SNAPSHOT_DIR = "balances"
+SNAPSHOT_PREFIX = "balances-"
+
+# Sessions allowed in the ledger tail before it is folded into a new snapshot
+COMPACT_EVERY = 50
+
+# In-process copy of the current balances, reused while the ledger is unchanged
+_balances_cache = {}
+
+
+def ledger_paths(last_file):
+    """Return (ledger file, snapshot directory) for the history directory holding last_file."""
+    store_dir = os.path.join(os.path.dirname(last_file), STORE_DIR)
+    return os.path.join(store_dir, LEDGER_FILE), os.path.join(store_dir, SNAPSHOT_DIR)
+
+
+def _ensure_ledger(last_file):
+    """Create the ledger and its first snapshot (imported from last_file) if they do not exist yet."""
+    ledger_file, snapshot_dir = ledger_paths(last_file)
+    os.makedirs(snapshot_dir, exist_ok=True)
+
+    if not os.path.exists(ledger_file):
+        pd.DataFrame(columns=LEDGER_COLUMNS).to_csv(ledger_file, index=False)
+
+    if _latest_snapshot(snapshot_dir) is None:
+        # Start from the balances kept in last_file before the ledger existed
+        initial = load_csv(last_file) if os.path.exists(last_file) else pd.DataFrame(columns=["Name"])
+        if "Debt" not in initial.columns:
+            initial["Debt"] = 0.0
+        initial["Debt"] = initial["Debt"].fillna(0.0).astype(float)
+        _write_snapshot(snapshot_dir, initial[["Name", "Debt"]], os.path.getsize(ledger_file))
+        logging.info(f"Debt ledger initialized from {last_file}")
+
+
+def _latest_snapshot(snapshot_dir):
+    """Return (offset, path) of the newest snapshot, or None."""
+    offsets = []
+    for name in os.listdir(snapshot_dir):
+        if name.startswith(SNAPSHOT_PREFIX) and name.endswith(".csv"):
+            offsets.append(int(name[len(SNAPSHOT_PREFIX) : -len(".csv")]))
+    if not offsets:
+        return None
+    offset = max(offsets)
+    return offset, os.path.join(snapshot_dir, f"{SNAPSHOT_PREFIX}{offset}.csv")
+
+
+def _write_snapshot(snapshot_dir, balances, offset):
+    path = os.path.join(snapshot_dir, f"{SNAPSHOT_PREFIX}{offset}.csv")
+    tmp_path = f"{path}.tmp"
+    balances.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+    # Older snapshots are superseded by the new one
+    for name in os.listdir(snapshot_dir):
+        if name.startswith(SNAPSHOT_PREFIX) and name != os.path.basename(path):
+            os.remove(os.path.join(snapshot_dir, name))
+
+
+def _load_tail(ledger_file, offset):
+    """Read the ledger rows written after the given byte offset."""
+    with open(ledger_file, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    if not data.strip():
+        return pd.DataFrame(columns=LEDGER_COLUMNS)
+    return pd.read_csv(io.BytesIO(data), header=None, names=LEDGER_COLUMNS, dtype={"Session": str})
+
+
+def append_debt_deltas(last_file, session, deltas):
+    """Append the debt changes of one session (Name, Debt) to the ledger."""
+    _ensure_ledger(last_file)
+    ledger_file, _ = ledger_paths(last_file)
+
+    rows = deltas[["Name", "Debt"]].copy()
+    rows.insert(0, "Session", session)
+    with file_lock(ledger_file):
+        rows.to_csv(ledger_file, mode="a", header=False, index=False)
+
+
+def balances_version(last_file):
+    """Version of the balances: changes whenever a session is added to the ledger or it is compacted."""
+    _ensure_ledger(last_file)
+    ledger_file, snapshot_dir = ledger_paths(last_file)
+    with file_lock(ledger_file, shared=True):
+        return _latest_snapshot(snapshot_dir)[1], file_version(ledger_file)
+
+
+def load_balances(last_file):
+    """Current balance of every user (Name, Debt): the latest snapshot plus the ledger tail."""
+    _ensure_ledger(last_file)
+    ledger_file, _ = ledger_paths(last_file)
+
+    # Appends and compactions hold the lock exclusively, so no half-written row or deleted snapshot is read
+    with file_lock(ledger_file, shared=True):
+        return _read_balances(last_file)
+
+
+def _read_balances(last_file):
+    """load_balances without taking the ledger lock (for callers that already hold it)."""
+    ledger_file, snapshot_dir = ledger_paths(last_file)
+    offset, snapshot_file = _latest_snapshot(snapshot_dir)
+
+    version = (snapshot_file, file_version(ledger_file))
+    cached = _balances_cache.get(ledger_file)
+    if cached is not None and cached[0] == version:
+        return cached[1].copy()
+
+    balances = load_csv(snapshot_file)
+    tail = _load_tail(ledger_file, offset)
+    if not tail.empty:
+        changes = tail.groupby("Name", sort=False)["Debt"].sum()
+        balances = balances.set_index("Name")
+        balances = balances.reindex(balances.index.append(changes.index.difference(balances.index)), fill_value=0.0)
+        balances.loc[changes.index, "Debt"] += changes
+        balances = balances.reset_index()
+        balances.columns = ["Name", "Debt"]
+
+    _balances_cache[ledger_file] = (version, balances)
+    return balances.copy()
+
+
+def compact_debt_ledger(last_file, force=False):
+    """Fold the ledger tail into a new snapshot once it holds COMPACT_EVERY sessions (or always, if forced)."""
+    _ensure_ledger(last_file)
+    ledger_file, snapshot_dir = ledger_paths(last_file)
+
+    with file_lock(ledger_file):
+        offset, _ = _latest_snapshot(snapshot_dir)
+        tail = _load_tail(ledger_file, offset)
+        if tail.empty or (not force and tail["Session"].nunique() < COMPACT_EVERY):
+            return False
+
+        balances = _read_balances(last_file)
+        _write_snapshot(snapshot_dir, balances, os.path.getsize(ledger_file))
+    logging.info(f"Debt ledger compacted: {len(tail)} rows folded into a new snapshot")
+    return True
+
+
+def add_user_to_last(last_file, new_user, new_debt):
+    # Check if the user already exists
+    if new_user in load_balances(last_file)["Name"].values:
+        return False
+
+    # Record the starting debt in the ledger
+    session = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    append_debt_deltas(last_file, session, pd.DataFrame({"Name": [new_user], "Debt": [float(new_debt)]}))
+    return True
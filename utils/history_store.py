@@ -0,0 +1,180 @@
+import os
+import logging
+import argparse
+import pandas as pd
+from datetime import datetime
+from utils.data_utils import load_whopaid, load_csv, file_version, file_lock
+
+
+# Consolidated history store: one table per record type, keyed by session timestamp
+STORE_DIR = "store"
+STORE_TABLES = {
+    "sessions": ["Session", "WhoPaid", "TotalPaid"],
+    "order": ["Session", "Name", "Drinks", "Food", "Debt"],
+    "bar": ["Session", "Item", "Amount"],
+    "machine": ["Session", "Item", "Amount"],
+    "debts": ["Session", "Name", "Debt"],
+    # Rollups derived from the order table (see statistics_utils)
+    "daily": ["Session", "Date", "Orders", "Spent"],
+    "daily_user": ["Session", "Date", "Name", "Orders", "Spent"],
+    "daily_item": ["Session", "Date", "Kind", "Item", "Count"],
+}
+
+# Files inside each history/<timestamp>/ directory
+SESSION_FILES = {
+    "whopaid": "whopaid.txt",
+    "order": "order.csv",
+    "bar": "bar.csv",
+    "machine": "machine.csv",
+    "debts": "debts.csv",
+}
+
+# In-process copy of each table (as written and filtered to committed sessions), reused while the files on disk are unchanged
+_table_cache = {}
+
+
+def store_path(history_dir, table):
+    return os.path.join(history_dir, STORE_DIR, f"{table}.csv")
+
+
+def session_files(whopaid_file, order_file, bar_file, machine_file, debts_file):
+    """Map the tmp file paths used by the app to the file names inside a session directory."""
+    return {
+        "whopaid": whopaid_file.split("/")[-1],
+        "order": order_file.split("/")[-1],
+        "bar": bar_file.split("/")[-1],
+        "machine": machine_file.split("/")[-1],
+        "debts": debts_file.split("/")[-1],
+    }
+
+
+def _read_store_table(path, table):
+    """(version, DataFrame) of a store table as written on disk, None version if it does not exist."""
+    version = file_version(path)
+    if version is None:
+        return None, pd.DataFrame(columns=STORE_TABLES[table])
+
+    cached = _table_cache.get((path, "raw"))
+    if cached is not None and cached[0] == version:
+        return cached
+
+    df = pd.read_csv(path, dtype={"Session": str})
+    _table_cache[(path, "raw")] = (version, df)
+    return version, df
+
+
+def load_raw_store_table(history_dir, table):
+    """Load a whole store table, including rows of sessions that are still being written. Treat it as read-only."""
+    return _read_store_table(store_path(history_dir, table), table)[1]
+
+
+def load_store_table(history_dir, table):
+    """Load a whole store table. The returned DataFrame is shared, treat it as read-only."""
+    path = store_path(history_dir, table)
+    version, df = _read_store_table(path, table)
+    if table == "sessions" or version is None:
+        return df
+
+    # Only keep rows of sessions that were fully written (the sessions table is written last),
+    # so the result depends on both files
+    sessions_version, sessions = _read_store_table(store_path(history_dir, "sessions"), "sessions")
+    cached = _table_cache.get((path, "committed"))
+    if cached is not None and cached[0] == (version, sessions_version):
+        return cached[1]
+
+    df = df[df["Session"].isin(sessions["Session"])]
+    _table_cache[(path, "committed")] = ((version, sessions_version), df)
+    return df
+
+
+def append_store_rows(history_dir, table, session, df):
+    """Append the rows of one session to a store table."""
+    path = store_path(history_dir, table)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    rows = df.copy()
+    rows.insert(0, "Session", session)
+    rows = rows.reindex(columns=STORE_TABLES[table])
+    rows.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+
+
+def append_session(history_dir, session, whopaid, price, order_df, bar_df, machine_df, debts_df):
+    """Append a closed session to every store table."""
+    append_store_rows(history_dir, "order", session, order_df)
+    append_store_rows(history_dir, "bar", session, bar_df)
+    append_store_rows(history_dir, "machine", session, machine_df)
+    append_store_rows(history_dir, "debts", session, debts_df)
+
+    # Written last so that a session only becomes visible once all of its rows are on disk
+    append_store_rows(history_dir, "sessions", session, pd.DataFrame({"WhoPaid": [whopaid], "TotalPaid": [price]}))
+
+
+def list_session_dirs(history_dir):
+    """List the history/<timestamp>/ session directories, without opening any file."""
+    if not os.path.isdir(history_dir):
+        return []
+    with os.scandir(history_dir) as entries:
+        return [entry.name for entry in entries if entry.is_dir() and entry.name != STORE_DIR]
+
+
+def migrate_history(history_dir, files=SESSION_FILES):
+    """Convert session directories that are not in the store yet. Returns the number of migrated sessions."""
+    known = set(load_store_table(history_dir, "sessions")["Session"])
+    if not any(d not in known for d in list_session_dirs(history_dir)):
+        return 0
+
+    # Check again under the lock, another thread or process may be migrating them
+    os.makedirs(os.path.join(history_dir, STORE_DIR), exist_ok=True)
+    with file_lock(store_path(history_dir, "sessions")):
+        return _migrate_pending(history_dir, files)
+
+
+def _migrate_pending(history_dir, files):
+    known = set(load_store_table(history_dir, "sessions")["Session"])
+    pending = sorted(
+        (d for d in list_session_dirs(history_dir) if d not in known),
+        key=lambda d: datetime.strptime(d, "%Y-%m-%d_%H-%M-%S"),
+    )
+    if not pending:
+        return 0
+
+    # Read every pending directory, then write each table once
+    frames = {table: [] for table in ("sessions", "order", "bar", "machine", "debts")}
+    for directory in pending:
+        dir_path = os.path.join(history_dir, directory)
+        try:
+            whopaid, price = load_whopaid(os.path.join(dir_path, files["whopaid"]))
+            tables = {table: load_csv(os.path.join(dir_path, files[table])) for table in ("order", "bar", "machine", "debts")}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Skipping unreadable history directory {dir_path}: {e}")
+            continue
+
+        tables["sessions"] = pd.DataFrame({"WhoPaid": [whopaid], "TotalPaid": [price]})
+        for table, df in tables.items():
+            df.insert(0, "Session", directory)
+            frames[table].append(df)
+
+    if not frames["sessions"]:
+        return 0
+
+    os.makedirs(os.path.join(history_dir, STORE_DIR), exist_ok=True)
+    for table in ("order", "bar", "machine", "debts", "sessions"):
+        path = store_path(history_dir, table)
+        df = pd.concat(frames[table], ignore_index=True).reindex(columns=STORE_TABLES[table])
+        df.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+
+    logging.info(f"Migrated {len(frames['sessions'])} history directories into {os.path.join(history_dir, STORE_DIR)}")
+    return len(frames["sessions"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert history/<timestamp>/ directories into the consolidated history store.")
+    parser.add_argument("history_dir", nargs="?", default="history", help="History directory (default: history)")
+    args = parser.parse_args()
+
+    migrated = migrate_history(args.history_dir)
+    print(f"Migrated {migrated} sessions into {os.path.join(args.history_dir, STORE_DIR)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,11 @@ import os
 import logging
 import pandas as pd
 from datetime import datetime
-from utils.data_utils import load_whopaid, save_whopaid, load_csv, save_csv
+from utils.data_utils import load_whopaid, save_whopaid, load_csv, save_csv, file_lock
+from utils.order_utils import read_order, ORDER_COLUMNS
+from utils.debt_ledger import append_debt_deltas, compact_debt_ledger, load_balances
+from utils.history_store import STORE_DIR, store_path, load_store_table, append_session, session_files
+from utils.statistics_utils import append_rollups, publish_session_closed
 
 
 # Configure logging
@@ -22,38 +26,30 @@ def format_date(date_str):
     return formatted_date
 
 
-# Load history from the local directory
-def load_history(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file):
-    # Load history directories
-    history_dirs = [d for d in os.listdir(history_dir) if os.path.isdir(os.path.join(history_dir, d))]
-
-    # For each directory, get data
-    history = []
-    for directory in history_dirs:
-        dir_path = os.path.join(history_dir, directory)
-
-        # Load data
-        whopaid = load_whopaid(os.path.join(dir_path, whopaid_file.split("/")[-1]))
-        order_df = load_csv(os.path.join(dir_path, order_file.split("/")[-1]))
-        bar_df = load_csv(os.path.join(dir_path, bar_file.split("/")[-1]))
-        machine_df = load_csv(os.path.join(dir_path, machine_file.split("/")[-1]))
-        debts_df = load_csv(os.path.join(dir_path, debts_file.split("/")[-1]))
-
-        # Format prices to show only 2 decimals
-        debts_df["Debt"] = debts_df["Debt"].apply(lambda x: f"{x:.2f}")
-
-        # Save data
-        history.append(
-            {
-                "Date": directory,
-                "Whopaid": whopaid,
-                "Order": order_df,
-                "Bar": bar_df,
-                "Machine": machine_df,
-                "Debts": debts_df,
-            }
-        )
-    return history
+# Load the lightweight list of sessions (date, payer, total), newest first
+def load_history_sessions(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file):
+    sessions = load_store_table(history_dir, "sessions")
+    return sessions.sort_values("Session", ascending=False).reset_index(drop=True)
+
+
+# Load the full record of a single session from its history directory
+def load_history_session(history_dir, session, whopaid_file, order_file, bar_file, machine_file, debts_file):
+    files = session_files(whopaid_file, order_file, bar_file, machine_file, debts_file)
+    dir_path = os.path.join(history_dir, session)
+
+    debts_df = load_csv(os.path.join(dir_path, files["debts"]))
+
+    # Format prices to show only 2 decimals
+    debts_df["Debt"] = debts_df["Debt"].apply(lambda x: f"{x:.2f}")
+
+    return {
+        "Date": session,
+        "Whopaid": load_whopaid(os.path.join(dir_path, files["whopaid"])),
+        "Order": load_csv(os.path.join(dir_path, files["order"])),
+        "Bar": load_csv(os.path.join(dir_path, files["bar"])),
+        "Machine": load_csv(os.path.join(dir_path, files["machine"])),
+        "Debts": debts_df,
+    }
 
 
 # Save the current summary to a text file in the local history directory
@@ -70,56 +66,65 @@ def save_history(history_dir, whopaid_file, order_file, bar_file, machine_file,
     machine_file_ = os.path.join(history_dir_, machine_file.split("/")[-1])
     debts_file_ = os.path.join(history_dir_, debts_file.split("/")[-1])
 
-    # Move tmp files to history
-    if os.path.exists(whopaid_file):
+    # Votes wait until the order is archived and emptied, so that none is lost in between
+    with file_lock(order_file):
+        # Move tmp files to history
         whopaid, price = load_whopaid(whopaid_file)
         save_whopaid(whopaid_file_, whopaid, price)
-    if os.path.exists(order_file):
-        order = load_csv(order_file)
+        order = read_order(order_file)
         debts = load_csv(debts_file)
         combined = pd.merge(order, debts, on="Name", how="inner")  # Combine order and debts
+        # Votes added after the ticket was generated are not in it, they stay for the next order
+        pending = order[~order["Name"].isin(debts["Name"])]
         save_csv(combined, order_file_)
-    if os.path.exists(bar_file):
-        save_csv(load_csv(bar_file), bar_file_)
-    if os.path.exists(machine_file):
-        save_csv(load_csv(machine_file), machine_file_)
-
-    # Update accumulated debts (and move it to history)
-    update_debts(whopaid_file, debts_file, last_file)
-    if os.path.exists(last_file):
-        save_csv(load_csv(last_file), debts_file_)
-
-    # Remove tmp data
-    os.remove(whopaid_file)
-    os.remove(order_file)
-    os.remove(bar_file)
-    os.remove(machine_file)
-    os.remove(debts_file)
+        bar = load_csv(bar_file)
+        save_csv(bar, bar_file_)
+        machine = load_csv(machine_file)
+        save_csv(machine, machine_file_)
+
+        # Update accumulated debts and keep a full snapshot of the balances after this session
+        update_debts(whopaid_file, debts_file, last_file, timestamp)
+        last_debts = load_balances(last_file)
+        save_csv(last_debts, debts_file_)
+
+        # Append the session to the consolidated history store (rollups first, the session row makes them visible)
+        os.makedirs(os.path.join(history_dir, STORE_DIR), exist_ok=True)
+        with file_lock(store_path(history_dir, "sessions")):
+            # A concurrent migration may have picked up the new directory already
+            if timestamp not in set(load_store_table(history_dir, "sessions")["Session"]):
+                append_rollups(history_dir, timestamp, combined)
+                append_session(history_dir, timestamp, whopaid, price, combined, bar, machine, last_debts)
+
+        # Remove tmp data, the next order starts with the votes that were not in the ticket
+        os.remove(whopaid_file)
+        tmp_order_file = f"{order_file}.tmp"
+        pending.reindex(columns=ORDER_COLUMNS).to_csv(tmp_order_file, index=False)
+        os.replace(tmp_order_file, order_file)
+        os.remove(bar_file)
+        os.remove(machine_file)
+        os.remove(debts_file)
+
+    # Derived data (statistics) is rebuilt in the background
+    publish_session_closed(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file)
 
     return timestamp
 
 
-def update_debts(whopaid_file, debts_file, last_file):
+def update_debts(whopaid_file, debts_file, last_file, session=None):
     # Load who paid
     whopaid, price = load_whopaid(whopaid_file)
 
-    # Get latest debts
-    last_debts = load_csv(last_file)
-    last_debts.set_index("Name", inplace=True)
-
     # Load current debts from debts file
-    curr_debts = load_csv(debts_file)
-    curr_debts = dict(zip(curr_debts["Name"], curr_debts["Debt"].astype(float)))
-
-    # Update debts: Merge current debts with historic debts
-    for user, debt in curr_debts.items():
-        if user == whopaid:
-            debt -= price
-        if user in last_debts.index:
-            last_debts.at[user, "Debt"] += debt
-        else:
-            last_debts.loc[user] = debt
-    last_debts.reset_index(inplace=True)
-
-    # Save the new debts as last debts
-    save_csv(last_debts, last_file)
+    deltas = load_csv(debts_file)[["Name", "Debt"]].copy()
+    deltas["Debt"] = deltas["Debt"].astype(float)
+
+    # The payer's debt goes down by what they paid
+    deltas.loc[deltas["Name"] == whopaid, "Debt"] -= price
+
+    # Append the changes to the debt ledger and fold it into a snapshot from time to time
+    if session is None:
+        session = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    append_debt_deltas(last_file, session, deltas)
+    compact_debt_ledger(last_file)
+
+    return deltas
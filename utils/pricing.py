@@ -0,0 +1,131 @@
+import yaml
+from utils.data_utils import file_version
+
+
+PRICING_FILE = "inputs/pricing.yaml"
+
+# Compiled pricing per config file, shared by every session of the process
+_pricing_cache = {}
+
+
+class Pricing:
+    """Lookup tables compiled once from pricing.yaml."""
+
+    def __init__(self, config):
+        # {item_name: (price, category)}
+        self.items = {name: (data["price"], data["category"]) for name, data in config["items"].items()}
+
+        # Price of each category: combos are solved and split per category, so all its items must cost the same
+        self.category_prices = {}
+        mixed = set()
+        for price, category in self.items.values():
+            if self.category_prices.setdefault(category, price) != price:
+                mixed.add(category)
+        if mixed:
+            raise ValueError(f"Items of the same category must have the same price in pricing.yaml: {', '.join(sorted(mixed))}")
+
+        # {(drink_category, food_category): price} for every pairing allowed by a combo
+        self.combos = config.get("combos", [])
+        self.combo_prices = {}
+        for combo in self.combos:
+            for drink_category in combo["drink_categories"]:
+                for food_category in combo["food_categories"]:
+                    self.combo_prices[(drink_category, food_category)] = combo["price"]
+
+        self.combinable_drinks = {drink_category for drink_category, _ in self.combo_prices}
+        self.combinable_foods = {food_category for _, food_category in self.combo_prices}
+        self.machine_display = config.get("machine_display", {})
+
+
+def load_pricing(config_file=PRICING_FILE):
+    """Return the compiled pricing, rebuilt only when the YAML file changes."""
+    version = file_version(config_file)
+    cached = _pricing_cache.get(config_file)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with open(config_file, "r", encoding="utf-8") as f:
+        pricing = Pricing(yaml.safe_load(f))
+
+    _pricing_cache[config_file] = (version, pricing)
+    return pricing
+
+
+def solve_combos(item_count, pricing):
+    """
+    Cost-minimizing pairing of drinks and foods into combos: {(drink_category, food_category): number_of_combos}.
+    Solved as a min-cost flow between categories (successive shortest paths), so its cost depends on the
+    number of categories in pricing.yaml, not on the number of people in the order.
+    """
+    drinks = [c for c in pricing.category_prices if c in pricing.combinable_drinks and item_count.get(c, 0) > 0]
+    foods = [c for c in pricing.category_prices if c in pricing.combinable_foods and item_count.get(c, 0) > 0]
+
+    # Graph: source -> drink categories -> food categories -> sink, costs are negative savings in cents
+    nodes = ["source", "sink"] + [("drink", c) for c in drinks] + [("food", c) for c in foods]
+    index = {node: i for i, node in enumerate(nodes)}
+    graph = [[] for _ in nodes]  # Edges as [to, capacity, cost, reverse edge position]
+
+    def add_edge(u, v, capacity, cost):
+        graph[u].append([v, capacity, cost, len(graph[v])])
+        graph[v].append([u, 0, -cost, len(graph[u]) - 1])
+
+    for drink in drinks:
+        add_edge(index["source"], index[("drink", drink)], item_count[drink], 0)
+    for food in foods:
+        add_edge(index[("food", food)], index["sink"], item_count[food], 0)
+    pair_edges = {}
+    for drink in drinks:
+        for food in foods:
+            price = pricing.combo_prices.get((drink, food))
+            if price is None:
+                continue
+            saving = round(100 * (pricing.category_prices[drink] + pricing.category_prices[food] - price))
+            if saving > 0:
+                u = index[("drink", drink)]
+                pair_edges[(drink, food)] = (u, len(graph[u]))
+                add_edge(u, index[("food", food)], min(item_count[drink], item_count[food]), -saving)
+
+    # Augment along the cheapest path while it still saves money
+    source, sink = index["source"], index["sink"]
+    while True:
+        # Bellman-Ford (residual costs can be negative)
+        dist = [None] * len(nodes)
+        parent = [None] * len(nodes)
+        dist[source] = 0
+        for _ in range(len(nodes) - 1):
+            updated = False
+            for u, edges in enumerate(graph):
+                if dist[u] is None:
+                    continue
+                for position, (v, capacity, cost, _) in enumerate(edges):
+                    if capacity > 0 and (dist[v] is None or dist[u] + cost < dist[v]):
+                        dist[v] = dist[u] + cost
+                        parent[v] = (u, position)
+                        updated = True
+            if not updated:
+                break
+
+        if dist[sink] is None or dist[sink] >= 0:
+            break
+
+        # Push as many combos as the path allows
+        path = []
+        v = sink
+        while v != source:
+            u, position = parent[v]
+            path.append((u, position))
+            v = u
+        flow = min(graph[u][position][1] for u, position in path)
+        for u, position in path:
+            edge = graph[u][position]
+            edge[1] -= flow
+            graph[edge[0]][edge[3]][1] += flow
+
+    # Flow on each drink -> food edge is the number of combos of that pair
+    pairs = {}
+    for pair, (u, position) in pair_edges.items():
+        v, capacity, _, reverse = graph[u][position]
+        combos = graph[v][reverse][1]
+        if combos > 0:
+            pairs[pair] = combos
+    return pairs
@@ -0,0 +1,121 @@
+import os
+import json
+import argparse
+from datetime import date, datetime
+from utils.history_store import SESSION_FILES, migrate_history
+from utils.statistics_utils import (
+    rebuild_statistics,
+    summary,
+    daily_spending,
+    daily_participation,
+    item_popularity,
+    user_participation,
+    payer_totals,
+    debt_evolution,
+)
+
+
+def generate_report(history_dir, output_dir, start_date=None, end_date=None, users=None, drinks=None, foods=None, html=False):
+    """
+    Write the Statistics dashboard's analytics for a date range to output_dir, without Streamlit:
+    summary.json plus one CSV per table, and one static HTML figure per table if html is set.
+    Returns the paths of the written files.
+    """
+    # The current version of the history, never the previous copy served while a background rebuild runs
+    data = rebuild_statistics(history_dir, *SESSION_FILES.values())
+    if data.empty:
+        raise ValueError(f"No history to report in {history_dir}")
+
+    # Default to the whole history
+    start_date = start_date or data.daily["Date"].min().date()
+    end_date = end_date or data.daily["Date"].max().date()
+    filters = (start_date, end_date, users, drinks, foods)
+
+    # Same queries as the dashboard (payers and debts are only filtered by date there too)
+    daily = daily_spending(data, *filters).merge(daily_participation(data, *filters), on="Date", how="outer")
+    tables = {
+        "daily": daily,
+        "drinks": item_popularity(data, "Drinks", *filters).rename(columns={"Item": "Drink"}),
+        "foods": item_popularity(data, "Food", *filters).rename(columns={"Item": "Food"}),
+        "participation": user_participation(data, *filters),
+        "payers": payer_totals(data, start_date, end_date),
+        "debt_evolution": debt_evolution(data, start_date, end_date),
+    }
+
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+
+    report = {
+        "generated": datetime.now().isoformat(timespec="seconds"),
+        "history_version": list(data.version) if data.version else None,
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "filters": {"users": users or [], "drinks": drinks or [], "foods": foods or []},
+        "summary": summary(data, *filters),
+        "top_payers": tables["payers"].head(3).to_dict(orient="records"),
+    }
+    path = os.path.join(output_dir, "summary.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+    written.append(path)
+
+    for name, df in tables.items():
+        path = os.path.join(output_dir, f"{name}.csv")
+        df.to_csv(path, index=False)
+        written.append(path)
+
+    if html:
+        written += _write_figures(tables, output_dir)
+
+    return written
+
+
+def _write_figures(tables, output_dir):
+    """Static HTML versions of the dashboard charts (plotly.js loaded from its CDN)."""
+    import plotly.express as px
+
+    figures = {
+        "daily": px.line(tables["daily"], x="Date", y="Total Spent", title="Daily Total Spending"),
+        "debt_evolution": px.line(tables["debt_evolution"], x="Date", y="AccumulatedDebt", color="Name", title="Accumulated Debt Over Time"),
+    }
+
+    # Horizontal bars, biggest first
+    bars = {
+        "drinks": ("Count", "Drink", "Drink Popularity"),
+        "foods": ("Count", "Food", "Food Popularity"),
+        "participation": ("Orders", "Name", "Participation Frequency"),
+        "payers": ("Total Paid", "Name", "Total Amount Paid by Each Person"),
+    }
+    for name, (x, y, title) in bars.items():
+        figures[name] = px.bar(tables[name], x=x, y=y, orientation="h", title=title)
+        figures[name].update_layout(yaxis={"categoryorder": "total ascending"})
+
+    written = []
+    for name, fig in figures.items():
+        path = os.path.join(output_dir, f"{name}.html")
+        fig.write_html(path, include_plotlyjs="cdn")
+        written.append(path)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the Statistics analytics of the history to CSV/JSON (and optionally HTML) files.")
+    parser.add_argument("output_dir", help="Directory to write the report to")
+    parser.add_argument("--history-dir", default="history", help="History directory (default: history)")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day (YYYY-MM-DD, default: first session)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day (YYYY-MM-DD, default: last session)")
+    parser.add_argument("--users", nargs="*", help="Only these users")
+    parser.add_argument("--drinks", nargs="*", help="Only these drinks")
+    parser.add_argument("--foods", nargs="*", help="Only these foods")
+    parser.add_argument("--html", action="store_true", help="Also write static HTML figures")
+    args = parser.parse_args()
+
+    # Bring history directories that are not in the store yet (the report itself only reads it)
+    migrate_history(args.history_dir)
+
+    written = generate_report(args.history_dir, args.output_dir, args.start, args.end, args.users, args.drinks, args.foods, args.html)
+    print(f"Wrote {len(written)} files to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
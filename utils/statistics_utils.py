@@ -0,0 +1,492 @@
+import os
+import queue
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from utils.data_utils import file_version, file_lock
+from utils.history_store import STORE_TABLES, load_store_table, load_raw_store_table, store_path
+
+
+# Rollups kept next to the history store, one group of rows per session
+ROLLUP_TABLES = ("daily", "daily_user", "daily_item")
+
+# Time buckets of the Statistics time series (pandas periods), and the most points a chart should send to the browser
+RESOLUTIONS = {"Daily": "D", "Weekly": "W", "Monthly": "M"}
+RESOLUTION_DAYS = {"Daily": 1, "Weekly": 7, "Monthly": 30}
+POINT_BUDGET = 1500
+
+# Statistics per history directory, shared read-only by every session of the process
+_statistics_cache = {}
+_statistics_lock = threading.Lock()
+_statistics_counter = {"hits": 0, "misses": 0, "stale": 0}
+_counter_lock = threading.Lock()
+
+# "Session closed" events, consumed by a background thread that rebuilds the statistics.
+# (history_dir, version) of the events still in the queue, so that a version is only queued once
+_rebuild_events = queue.Queue()
+_pending_rebuilds = set()
+_rebuild_worker = None
+_rebuild_worker_lock = threading.Lock()
+
+
+def compute_rollups(orders):
+    """Aggregate order rows (Session, Name, Drinks, Food, Debt) into the rollup tables."""
+    orders = orders.assign(Date=orders["Session"].str[:10], Debt=orders["Debt"].astype(float))
+
+    # Orders and spending per day, and per day and user
+    daily = orders.groupby(["Session", "Date"], sort=False).agg(Orders=("Name", "size"), Spent=("Debt", "sum")).reset_index()
+    daily_user = orders.groupby(["Session", "Date", "Name"], sort=False).agg(Orders=("Name", "size"), Spent=("Debt", "sum")).reset_index()
+
+    # Times each drink and food was ordered per day
+    items = []
+    for kind in ("Drinks", "Food"):
+        counts = orders.groupby(["Session", "Date", kind], sort=False).size().reset_index(name="Count")
+        counts = counts.rename(columns={kind: "Item"})
+        counts.insert(2, "Kind", kind)
+        items.append(counts)
+    daily_item = pd.concat(items, ignore_index=True)
+
+    return {"daily": daily, "daily_user": daily_user, "daily_item": daily_item}
+
+
+def write_rollups(history_dir, rollups):
+    """Append computed rollups to their store tables."""
+    for table in ROLLUP_TABLES:
+        path = store_path(history_dir, table)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        rows = rollups[table].reindex(columns=STORE_TABLES[table])
+        rows.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+
+
+def append_rollups(history_dir, session, order_df):
+    """Add the rollups of a session that is being closed (call it before its row is added to the sessions table)."""
+    write_rollups(history_dir, compute_rollups(order_df.assign(Session=session)))
+
+
+def sync_rollups(history_dir):
+    """Build the rollups of stored sessions that have none yet (migrated history, interrupted saves). Returns the number of sessions added."""
+    sessions = set(load_store_table(history_dir, "sessions")["Session"])
+    if not sessions - set(load_store_table(history_dir, "daily")["Session"]):
+        return 0
+
+    # Check again under the lock, another process may have just built them. Look at every row on disk:
+    # save_history writes the rollups of a session before its sessions row
+    with file_lock(store_path(history_dir, "daily")):
+        missing = sessions - set(load_raw_store_table(history_dir, "daily")["Session"])
+        orders = load_store_table(history_dir, "order")
+        orders = orders[orders["Session"].isin(missing)]
+        if orders.empty:
+            return 0
+        write_rollups(history_dir, compute_rollups(orders))
+    return orders["Session"].nunique()
+
+
+class FilterIndex:
+    """Sorted row ids of a frame for every value of some categorical columns (an inverted index)."""
+
+    def __init__(self, df, columns):
+        self.postings = {}
+        for column in columns:
+            categories = df[column].cat.categories
+            codes = df[column].cat.codes.to_numpy()
+
+            # Rows grouped by value, in row order within each value
+            order = np.argsort(codes, kind="stable").astype(np.int32)
+            bounds = np.searchsorted(codes[order], np.arange(len(categories) + 1))
+            self.postings[column] = {value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(categories)}
+
+    def rows(self, column, values, start, stop):
+        """Sorted row ids in [start, stop) where column is one of values."""
+        lists = []
+        for value in values:
+            rows = self.postings[column].get(value)
+            if rows is not None:
+                lists.append(rows[rows.searchsorted(start):rows.searchsorted(stop)])
+        if not lists:
+            return np.empty(0, dtype=np.int32)
+        return np.sort(np.concatenate(lists))
+
+    def query(self, start, stop, **filters):
+        """Sorted row ids in [start, stop) matching every filter (column=values, empty filters are ignored)."""
+        result = None
+        for column, values in filters.items():
+            if not values:
+                continue
+            rows = self.rows(column, values, start, stop)
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+        if result is None:
+            return np.arange(start, stop)
+        return result
+
+
+class StatisticsData:
+    """
+    Everything the Statistics dashboard queries: raw rows for item-filtered views, rollups for the rest.
+    Orders and debts are compact frames sorted by SessionId, the row of their session in the sessions table.
+    """
+
+    def __init__(self, sessions, orders, debts, daily, daily_user, daily_item, version=None):
+        self.version = version  # History version the data was built from
+        self.sessions = sessions
+        self.orders = orders
+        self.debts = debts
+        self.daily = daily
+        self.daily_user = daily_user
+        self.daily_item = daily_item
+
+        # Row ids per user/drink/food, so that filters intersect short lists instead of scanning the frames
+        self.orders_index = FilterIndex(orders, ["Name", "Drinks", "Food"])
+        self.daily_user_index = FilterIndex(daily_user, ["Name"])
+
+    @property
+    def empty(self):
+        return self.orders.empty
+
+
+def _parse_day(df):
+    df = df.sort_values("Date", kind="stable").reset_index(drop=True)
+    df["Date"] = pd.to_datetime(df["Date"], format="%Y-%m-%d")
+    for column in ("Name", "Kind", "Item"):
+        if column in df:
+            df[column] = df[column].astype(str).astype("category")
+    return df
+
+
+def _cents(values):
+    return np.round(values.astype(float).to_numpy() * 100).astype(np.int32)
+
+
+def history_version(history_dir):
+    """Version of the stored history. The sessions table is written last when a session is saved, so it changes with every session."""
+    return file_version(store_path(history_dir, "sessions"))
+
+
+def load_statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file):
+    """
+    Return the statistics of the history. The returned data is shared, treat it as read-only.
+    When sessions were added since it was built, the previous version is returned while the background worker builds the new one;
+    only the very first call waits for a build.
+    """
+    version = history_version(history_dir)
+    cached = _statistics_cache.get(history_dir)
+    if cached is not None:
+        if cached[0] == version:
+            _count("hits")
+        else:
+            # The history changed (maybe in another process), serve the previous version meanwhile
+            _count("stale")
+            publish_session_closed(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file)
+        return cached[1]
+
+    return rebuild_statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file)
+
+
+def rebuild_statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file):
+    """Build the statistics of the current history version (if they are not built yet) and swap them in."""
+    # A single thread builds them, the others wait for it instead of building their own copy
+    with _statistics_lock:
+        version = history_version(history_dir)
+        cached = _statistics_cache.get(history_dir)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        _count("misses")
+        data = _build_statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file, version)
+
+        # Readers get either the previous data or the new one, never a partial build
+        _statistics_cache[history_dir] = (version, data)
+        info = statistics_cache_info()
+        logging.info(f"Statistics of {history_dir} rebuilt (hits: {info['hits']}, misses: {info['misses']})")
+        return data
+
+
+def publish_session_closed(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file):
+    """
+    Tell the background worker that the history changed, so that it rebuilds the statistics before anyone asks for them.
+    Nothing is queued if a rebuild of the current version is already pending.
+    """
+    global _rebuild_worker
+    key = (history_dir, history_version(history_dir))
+    with _rebuild_worker_lock:
+        if key in _pending_rebuilds:
+            return
+        _pending_rebuilds.add(key)
+
+        if _rebuild_worker is None or not _rebuild_worker.is_alive():
+            _rebuild_worker = threading.Thread(target=_rebuild_loop, name="statistics-rebuild", daemon=True)
+            _rebuild_worker.start()
+        _rebuild_events.put((key, (whopaid_file, order_file, bar_file, machine_file, debts_file)))
+
+
+def _rebuild_loop():
+    while True:
+        key, files = _rebuild_events.get()
+        try:
+            # Events for an already rebuilt version are skipped by rebuild_statistics
+            rebuild_statistics(key[0], *files)
+        except Exception:
+            logging.exception(f"Background rebuild of the statistics of {key[0]} failed")
+        finally:
+            with _rebuild_worker_lock:
+                _pending_rebuilds.discard(key)
+
+
+def statistics_cache_info():
+    """Hits, misses and stale reads (served while rebuilding) of the statistics cache since the process started."""
+    with _counter_lock:
+        return dict(_statistics_counter)
+
+
+def _count(event):
+    # Counted from the UI threads and the rebuild thread
+    with _counter_lock:
+        _statistics_counter[event] += 1
+
+
+def _build_statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file, version=None):
+    """Load the history store and its rollups for the Statistics dashboard."""
+    # Rollups of sessions that do not have them yet
+    sync_rollups(history_dir)
+
+    sessions = load_sessions_table(history_dir)
+    orders, accumulated_debts = load_statistics_data(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file, sessions)
+
+    return StatisticsData(
+        sessions=sessions,
+        orders=orders,
+        debts=accumulated_debts,
+        daily=_parse_day(load_store_table(history_dir, "daily")),
+        daily_user=_parse_day(load_store_table(history_dir, "daily_user")),
+        daily_item=_parse_day(load_store_table(history_dir, "daily_item")),
+        version=version,
+    )
+
+
+def load_sessions_table(history_dir):
+    """
+    Sessions sorted by date: SessionId (int32, the row number), Session, Date (parsed once per session),
+    WhoPaid (categorical) and TotalPaid.
+    """
+    sessions = load_store_table(history_dir, "sessions").sort_values("Session", kind="stable").reset_index(drop=True)
+    return pd.DataFrame({
+        "SessionId": np.arange(len(sessions), dtype=np.int32),
+        "Session": sessions["Session"].astype(str),
+        "Date": pd.to_datetime(sessions["Session"], format="%Y-%m-%d_%H-%M-%S"),
+        "WhoPaid": sessions["WhoPaid"].astype(str).astype("category"),
+        "TotalPaid": sessions["TotalPaid"].astype(float),
+    })
+
+
+def load_statistics_data(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file, sessions=None):
+    """
+    Load all historical data for statistics as compact frames: categorical strings, int32 session ids
+    into the sessions table (which holds date, payer and total) and amounts in integer cents.
+    Returns (orders: SessionId, Name, Drinks, Food, DebtCents) and (debts: SessionId, Name, BalanceCents).
+    """
+    # Read whole tables from the history store
+    if sessions is None:
+        sessions = load_sessions_table(history_dir)
+    orders = load_store_table(history_dir, "order")
+    debts = load_store_table(history_dir, "debts")
+
+    def session_ids(df):
+        # Row of each session in the sessions table, -1 if it is not there
+        return pd.Categorical(df["Session"], categories=sessions["Session"]).codes.astype(np.int32)
+
+    compact_orders = pd.DataFrame({
+        "SessionId": session_ids(orders),
+        "Name": orders["Name"].astype(str).astype("category"),
+        "Drinks": orders["Drinks"].astype(str).astype("category"),
+        "Food": orders["Food"].astype(str).astype("category"),
+        "DebtCents": _cents(orders["Debt"]),
+    })
+
+    # Balances after each session
+    compact_debts = pd.DataFrame({
+        "SessionId": session_ids(debts),
+        "Name": debts["Name"].astype(str).astype("category"),
+        "BalanceCents": _cents(debts["Debt"]),
+    })
+
+    def by_session(df):
+        return df[df["SessionId"] >= 0].sort_values("SessionId", kind="stable").reset_index(drop=True)
+
+    return by_session(compact_orders), by_session(compact_debts)
+
+
+# Queries used by the dashboard. Rollups answer everything that is not filtered by drink or food,
+# the raw order rows are only scanned when an item filter is set.
+
+def _date_rows(df, start_date, end_date):
+    """[start, stop) rows of a frame sorted by Date that fall in the date range (binary search)."""
+    dates = df["Date"]
+    return dates.searchsorted(pd.Timestamp(start_date), side="left"), dates.searchsorted(pd.Timestamp(end_date) + pd.Timedelta(days=1), side="left")
+
+
+def _in_range(df, start_date, end_date):
+    start, stop = _date_rows(df, start_date, end_date)
+    return df.iloc[start:stop]
+
+
+def _session_rows(data, df, start_date, end_date):
+    """[start, stop) rows of a frame sorted by SessionId whose session is in the date range."""
+    first, last = _date_rows(data.sessions, start_date, end_date)
+    session_ids = df["SessionId"]
+    return session_ids.searchsorted(first, side="left"), session_ids.searchsorted(last, side="left")
+
+
+def _session_slice(data, df, start_date, end_date):
+    start, stop = _session_rows(data, df, start_date, end_date)
+    return df.iloc[start:stop]
+
+
+def _session_dates(data, df):
+    """Date of the session of each row."""
+    return pd.Series(data.sessions["Date"].to_numpy()[df["SessionId"].to_numpy()], index=df.index)
+
+
+def filter_orders(data, start_date, end_date, users=None, drinks=None, foods=None):
+    """Compact order rows matching every filter."""
+    start, stop = _session_rows(data, data.orders, start_date, end_date)
+    return data.orders.iloc[data.orders_index.query(start, stop, Name=users, Drinks=drinks, Food=foods)]
+
+
+def _daily_user_rows(data, start_date, end_date, users=None):
+    """Rows of the day x user rollup in the date range, for the given users (all if None)."""
+    start, stop = _date_rows(data.daily_user, start_date, end_date)
+    return data.daily_user.iloc[data.daily_user_index.query(start, stop, Name=users)]
+
+
+def _daily_rows(data, start_date, end_date, users=None, drinks=None, foods=None):
+    """Rows with Date (day), Name, Orders and Spent, from the rollups whenever possible."""
+    if drinks or foods:
+        df = filter_orders(data, start_date, end_date, users, drinks, foods)
+        return pd.DataFrame({"Date": _session_dates(data, df).dt.normalize(), "Name": df["Name"], "Orders": 1, "Spent": df["DebtCents"] / 100})
+
+    if users:
+        return _daily_user_rows(data, start_date, end_date, users)
+    return _in_range(data.daily, start_date, end_date)
+
+
+def daily_spending(data, start_date, end_date, users=None, drinks=None, foods=None):
+    """Total spent per day: Date, Total Spent."""
+    df = _daily_rows(data, start_date, end_date, users, drinks, foods)
+    df = df.groupby(df["Date"].dt.date)["Spent"].sum().reset_index()
+    df.columns = ["Date", "Total Spent"]
+    return df
+
+
+def user_daily_spending(data, start_date, end_date, users=None, drinks=None, foods=None):
+    """Spent per day and user: Date, Name, Total Spent."""
+    if drinks or foods:
+        df = _daily_rows(data, start_date, end_date, users, drinks, foods)
+    else:
+        df = _daily_user_rows(data, start_date, end_date, users)
+    df = df.groupby([df["Date"].dt.date, "Name"], observed=True)["Spent"].sum().reset_index()
+    df.columns = ["Date", "Name", "Total Spent"]
+    return df
+
+
+def daily_participation(data, start_date, end_date, users=None, drinks=None, foods=None):
+    """Number of orders per day: Date, Number of Orders."""
+    df = _daily_rows(data, start_date, end_date, users, drinks, foods)
+    df = df.groupby(df["Date"].dt.date)["Orders"].sum().reset_index()
+    df.columns = ["Date", "Number of Orders"]
+    return df
+
+
+def item_popularity(data, kind, start_date, end_date, users=None, drinks=None, foods=None):
+    """Times each item of a kind ("Drinks" or "Food") was ordered, most popular first: Item, Count."""
+    if users or drinks or foods:
+        df = filter_orders(data, start_date, end_date, users, drinks, foods)
+        counts = df[kind].value_counts()
+    else:
+        df = _in_range(data.daily_item, start_date, end_date)
+        df = df[df["Kind"] == kind]
+        counts = df.groupby("Item", observed=True)["Count"].sum().sort_values(ascending=False)
+    counts = counts[(counts.index != "Nada") & (counts > 0)]
+    return pd.DataFrame({"Item": counts.index.astype(str), "Count": counts.values})
+
+
+def user_participation(data, start_date, end_date, users=None, drinks=None, foods=None):
+    """Number of orders per user, most active first: Name, Orders."""
+    if drinks or foods:
+        counts = filter_orders(data, start_date, end_date, users, drinks, foods)["Name"].value_counts()
+    else:
+        df = _daily_user_rows(data, start_date, end_date, users)
+        counts = df.groupby("Name", observed=True)["Orders"].sum().sort_values(ascending=False)
+    counts = counts[counts > 0]
+    return pd.DataFrame({"Name": counts.index.astype(str), "Orders": counts.values})
+
+
+def zero_fill(df, start_date, end_date, value, key=None, keys=None):
+    """
+    Complete a daily series with a zero for every missing day (and every key, e.g. "Name") in one reindex
+    over the date x key grid. keys defaults to the keys present in df.
+    """
+    dates = pd.date_range(start=start_date, end=end_date, freq="D").date
+    if key is None:
+        index = pd.Index(dates, name="Date")
+        columns = ["Date"]
+    else:
+        if keys is None:
+            keys = df[key].unique()
+        index = pd.MultiIndex.from_product([dates, keys], names=["Date", key])
+        columns = ["Date", key]
+
+    filled = df.set_index(columns)[value].reindex(index, fill_value=0)
+    return filled.reset_index()
+
+
+def auto_resolution(start_date, end_date, series=1, budget=POINT_BUDGET):
+    """Finest resolution that keeps `series` daily series over the date range within the point budget."""
+    days = (end_date - start_date).days + 1
+    for resolution, bucket_days in RESOLUTION_DAYS.items():
+        if days * max(series, 1) / bucket_days <= budget:
+            return resolution
+    return "Monthly"
+
+
+def bucket_series(df, value, resolution, key=None, how="sum"):
+    """
+    Downsample a daily series (Date, [key], value) to weekly or monthly buckets dated by their first day.
+    Use how="sum" for amounts and counts, how="last" for levels such as balances.
+    """
+    if resolution == "Daily" or df.empty:
+        return df
+
+    period = pd.to_datetime(df["Date"]).dt.to_period(RESOLUTIONS[resolution]).dt.start_time.dt.date
+    groups = [period.rename("Date")] + ([df[key]] if key else [])
+    return df.groupby(groups, sort=True, observed=True)[value].agg(how).reset_index()
+
+
+def payment_records(data, start_date, end_date):
+    """Who paid each session in the date range and how much: Date, WhoPaid, TotalPaid."""
+    df = _session_slice(data, data.sessions, start_date, end_date)
+    return pd.DataFrame({"Date": df["Date"], "WhoPaid": df["WhoPaid"].astype(str), "TotalPaid": df["TotalPaid"]})
+
+
+def payer_totals(data, start_date, end_date):
+    """Times each person paid and the total they paid in the date range, biggest payer first: Name, Times Paid, Total Paid."""
+    payments = payment_records(data, start_date, end_date)
+    totals = payments.groupby("WhoPaid").agg(**{"Times Paid": ("TotalPaid", "size"), "Total Paid": ("TotalPaid", "sum")})
+    return totals.sort_values("Total Paid", ascending=False).rename_axis("Name").reset_index()
+
+
+def debt_evolution(data, start_date, end_date):
+    """Accumulated debt of each participant after every session in the date range: Date, Name, AccumulatedDebt."""
+    df = _session_slice(data, data.debts, start_date, end_date)
+    return pd.DataFrame({"Date": _session_dates(data, df), "Name": df["Name"].astype(str), "AccumulatedDebt": df["BalanceCents"] / 100})
+
+
+def summary(data, start_date, end_date, users=None, drinks=None, foods=None):
+    """Summary metrics: breakfast days, individual orders, total spent and average spent per day."""
+    df = _daily_rows(data, start_date, end_date, users, drinks, foods)
+    per_day = df.groupby(df["Date"].dt.date)["Spent"].sum()
+    return {
+        "sessions": len(per_day),
+        "orders": int(df["Orders"].sum()),
+        "spent": float(df["Spent"].sum()),
+        "avg_per_session": float(per_day.mean()) if len(per_day) > 0 else None,
+    }
@@ -0,0 +1,72 @@
+from utils.data_utils import load_yaml, save_yaml, file_version
+
+
+# Parsed users.yaml per file, shared by every session of the process
+_registry_cache = {}
+
+
+class UserRegistry:
+    """Users parsed once from users.yaml, split by status."""
+
+    def __init__(self, data):
+        self.data = data
+        self.users = list(data.keys())
+        self.statuses = {}
+        for user, value in data.items():
+            # Handle both old format (just a number) and new format (dict with status)
+            if isinstance(value, dict):
+                self.statuses[user] = value.get("status", "active")
+            else:
+                # Old format - all users are active by default
+                self.statuses[user] = "active"
+        self.active = [user for user in self.users if self.statuses[user] == "active"]
+        self.hidden = [user for user in self.users if self.statuses[user] == "hidden"]
+
+
+def load_user_registry(yaml_file):
+    """Return the user registry, only parsing users.yaml again when the file changes."""
+    version = file_version(yaml_file)
+    cached = _registry_cache.get(yaml_file)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    registry = UserRegistry(load_yaml(yaml_file))
+    _registry_cache[yaml_file] = (version, registry)
+    return registry
+
+
+def load_users(yaml_file):
+    return list(load_user_registry(yaml_file).users)
+
+
+def load_active_users(yaml_file):
+    """Load only active users (not hidden) from the YAML file."""
+    return list(load_user_registry(yaml_file).active)
+
+
+def load_hidden_users(yaml_file):
+    """Load only hidden users from the YAML file."""
+    return list(load_user_registry(yaml_file).hidden)
+
+
+def set_user_statuses(yaml_file, changes):
+    """Apply several {user_name: new_status} changes with a single write. Returns the users that were updated."""
+    data = load_yaml(yaml_file)
+
+    updated = []
+    for user_name, new_status in changes.items():
+        if user_name not in data:
+            continue
+
+        # Convert old format to new format if needed
+        if not isinstance(data[user_name], dict):
+            data[user_name] = {"debt": data[user_name], "status": "active"}
+
+        # Update status
+        data[user_name]["status"] = new_status
+        updated.append(user_name)
+
+    if updated:
+        save_yaml(data, yaml_file)
+        _registry_cache[yaml_file] = (file_version(yaml_file), UserRegistry(data))
+    return updated
@@ -1,6 +0,0 @@
-from .poll import poll
-from .debts import debts
-from .current import current
-from .history import history
-from .morosos import morosos
-from .statistics import statistics
@@ -1,7 +1,7 @@
 import os
 import pandas as pd
 import streamlit as st
-from utils import save_history, save_whopaid, save_order, load_order, load_csv, save_csv, ticket_logic
+from utils import save_history, save_whopaid, remove_order_rows, load_order, load_balances, save_csv, ticket_logic
 
 
 def current(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file, last_file):
@@ -60,7 +60,14 @@ def current(history_dir, whopaid_file, order_file, bar_file, machine_file, debts
     with metric_col3:
         if st.session_state.order_state > 0:
             # Calculate total price only if ticket was generated
-            bar_ticket, machine_ticket, debts_ticket = ticket_logic(st.session_state.current_df)
+            try:
+                bar_ticket, machine_ticket, debts_ticket = ticket_logic(st.session_state.current_df)
+            except KeyError as e:
+                st.error(f"❌ {e.args[0]}. Add them to inputs/pricing.yaml or remove those orders.")
+                st.stop()
+            except ValueError as e:
+                st.error(f"❌ {e}")
+                st.stop()
             total_price = sum([float(price) for price in debts_ticket["Debt"]])
             st.metric("Total to Pay", f"{total_price:.2f} €")
         else:
@@ -87,11 +94,8 @@ def current(history_dir, whopaid_file, order_file, bar_file, machine_file, debts
 
             # Remove selected rows on button click
             def remove_onclick():
-                # Remove rows
-                st.session_state.current_df = st.session_state.current_df.drop(index=remove_rows).reset_index(drop=True)
-
-                # Save new dataframe
-                save_order(st.session_state.current_df, order_file, combine=False)
+                # Remove rows (votes received in the meantime are kept)
+                st.session_state.current_df = remove_order_rows(st.session_state.current_df.loc[remove_rows], order_file)
 
                 # Remove tmp data
                 if os.path.exists(bar_file):
@@ -149,7 +153,7 @@ def current(history_dir, whopaid_file, order_file, bar_file, machine_file, debts
         st.subheader("💸 Payment")
 
         # Get historic debts
-        last_debts = load_csv(last_file)
+        last_debts = load_balances(last_file)
         last_debts = pd.merge(debts_ticket.drop(columns=["Debt"]), last_debts, on="Name", how="left")
         last_debts = last_debts.sort_values(by="Debt", ascending=False)
 
@@ -186,13 +190,7 @@ def current(history_dir, whopaid_file, order_file, bar_file, machine_file, debts
                             timestamp = save_history(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file, last_file)
                             st.success(f"Poll saved to history at {timestamp}", icon="🎉")
 
-                            # Clear local current selections
-                            if os.path.exists(order_file):
-                                os.remove(order_file)
-
-                                # Create an empty CSV to replace the deleted one
-                                pd.DataFrame(columns=["Name", "Drinks", "Food"]).to_csv(order_file, index=False)
-
+                            # The current order was moved to history, the next vote starts a new one
                             # Reset session state for current selections and ticket generation status
                             st.session_state.order_state = 0
 
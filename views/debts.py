@@ -1,6 +1,65 @@
+import threading
+import pandas as pd
 import streamlit as st
 import plotly.express as px
-from utils import load_csv, load_users
+from utils import load_balances, balances_version, load_users
+
+
+# Sorted podium and chart per balances file, shared by every session until a poll is closed
+_debts_cache = {}
+_debts_lock = threading.Lock()
+
+
+def build_debts_view(last_file):
+    """Return (podium table, bar chart) for the current balances, rebuilt only when they change."""
+    version = balances_version(last_file)
+    cached = _debts_cache.get(last_file)
+    if cached is not None and cached[0] == version:
+        return cached[1], cached[2]
+
+    with _debts_lock:
+        # Current balances from the debt ledger, highest debt first
+        debts_data = load_balances(last_file)
+        sorted_debts = debts_data.sort_values(by="Debt", ascending=False).reset_index(drop=True)
+
+        # Calculate dynamic height based on number of users (30px per user, minimum 400px)
+        chart_height = max(400, len(sorted_debts) * 30)
+
+        # Create horizontal bar chart with diverging color scale
+        # Red for high debt (positive), white for ~0, green for overpayment (negative)
+        fig = px.bar(
+            sorted_debts,
+            x="Debt",
+            y="Name",
+            orientation="h",
+            title="Current Debt by User",
+            color="Debt",
+            color_continuous_scale="RdYlGn_r",  # Red-Yellow-Green reversed (red for positive, green for negative)
+            color_continuous_midpoint=0,  # Center the color scale at 0
+            labels={"Debt": "Debt (€)", "Name": "User"}
+        )
+
+        fig.update_layout(
+            yaxis={'categoryorder': 'total ascending'},
+            height=chart_height,
+            xaxis_title="Debt (€)",
+            yaxis_title="User"
+        )
+
+        # Add vertical line at x=0 to show the debt/credit boundary
+        fig.add_vline(x=0, line_dash="dash", line_color="gray", opacity=0.7, line_width=2)
+
+        # Podium: medals for the top 3, then positions
+        ranks = [["🥇", "🥈", "🥉"][idx] if idx < 3 else f"{idx + 1}." for idx in range(len(sorted_debts))]
+        podium = pd.DataFrame({
+            "#": ranks,
+            "Name": sorted_debts["Name"],
+            "": ["🔴" if debt > 0 else ("🟢" if debt < 0 else "⚪") for debt in sorted_debts["Debt"]],
+            "Debt": sorted_debts["Debt"].round(2),
+        })
+
+        _debts_cache[last_file] = (version, podium, fig)
+        return podium, fig
 
 
 def debts(users_file, last_file):
@@ -15,38 +74,7 @@ def debts(users_file, last_file):
         st.session_state.new_debt = 0.0
         st.session_state.new_desc = ""
 
-    # Find the latest history directory
-    debts_data = load_csv(last_file)
-
-    # Sort by debt (descending - highest debt first)
-    debts_data_sorted = debts_data.sort_values(by="Debt", ascending=True).reset_index(drop=True)
-
-    # Calculate dynamic height based on number of users (30px per user, minimum 400px)
-    chart_height = max(400, len(debts_data_sorted) * 30)
-
-    # Create horizontal bar chart with diverging color scale
-    # Red for high debt (positive), white for ~0, green for overpayment (negative)
-    fig = px.bar(
-        debts_data_sorted,
-        x="Debt",
-        y="Name",
-        orientation="h",
-        title="Current Debt by User",
-        color="Debt",
-        color_continuous_scale="RdYlGn_r",  # Red-Yellow-Green reversed (red for positive, green for negative)
-        color_continuous_midpoint=0,  # Center the color scale at 0
-        labels={"Debt": "Debt (€)", "Name": "User"}
-    )
-
-    fig.update_layout(
-        yaxis={'categoryorder': 'total ascending'},
-        height=chart_height,
-        xaxis_title="Debt (€)",
-        yaxis_title="User"
-    )
-
-    # Add vertical line at x=0 to show the debt/credit boundary
-    fig.add_vline(x=0, line_dash="dash", line_color="gray", opacity=0.7, line_width=2)
+    podium, fig = build_debts_view(last_file)
 
     st.plotly_chart(fig, use_container_width=True)
 
@@ -54,28 +82,12 @@ def debts(users_file, last_file):
 
     st.divider()
 
-    # Sort by debt
-    sorted_debts = debts_data.sort_values(by="Debt", ascending=False).reset_index(drop=True)
-
-    # Print each row
+    # Single table, whatever the number of users
     st.header("Podium")
-    for idx, row in sorted_debts.iterrows():
-        # Get number
-        match idx:
-            case 0:
-                number = "🥇"
-            case 1:
-                number = "🥈"
-            case 2:
-                number = "🥉"
-            case _:
-                number = f"{idx + 1}."
-
-        # Print name and debt in 2 columns
-        col1, col2 = st.columns([1, 3])  # Makes the 2nd column 3 times wider than the 1st one
-        with col1:
-            st.write(f"{number} {row['Name']}")
-        with col2:
-            debt_sign = f"{':red[+' if row['Debt'] > 0 else (':green[-' if row['Debt'] < 0 else '')}"
-            debt_value = f"{abs(row['Debt']):.2f}{' €]' if row['Debt'] != 0 else ' €'}"
-            st.write(f"{debt_sign} {debt_value}")
+    st.dataframe(
+        podium,
+        hide_index=True,
+        use_container_width=True,
+        height=min(35 * (len(podium) + 1) + 3, 800),
+        column_config={"Debt": st.column_config.NumberColumn("Debt", format="%+.2f €")},
+    )
@@ -1,6 +1,10 @@
+import math
 import streamlit as st
-from datetime import datetime
-from utils import load_history, format_date
+from utils import load_history_sessions, load_history_session, format_date
+
+
+# Number of sessions listed per page
+PAGE_SIZE = 20
 
 
 def history(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file):
@@ -9,32 +13,61 @@ def history(history_dir, whopaid_file, order_file, bar_file, machine_file, debts
     # Check if user moved to other menu
     if st.session_state.state != "History":
         st.session_state.state = "History"
+        st.session_state.history_page = 1
+        st.session_state.history_open = set()
 
-    # Load history if it's not already loaded
-    history = load_history(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file)
+    # Initialize state
+    if "history_page" not in st.session_state:
+        st.session_state.history_page = 1
+    if "history_open" not in st.session_state:
+        st.session_state.history_open = set()
 
-    # Sort history by the date key in descending order
-    history = sorted(history, key=lambda x: datetime.strptime(x["Date"], "%Y-%m-%d_%H-%M-%S"), reverse=True)
+    # On click events
+    def open_onclick(session):
+        st.session_state.history_open.add(session)
 
-    # Display history in reverse chronological order
-    if history:
-        for record in history:
-            # Format the date for display
-            formatted_date = format_date(record["Date"])
-
-            # Show data
-            with st.expander(f"{formatted_date}"):
-                st.markdown("#### Who Paid")
-                name, price = record["Whopaid"]
-                st.write(f"**{name} paid {price:.2f} €**")
-                st.markdown("#### Order")
-                st.dataframe(record["Order"], hide_index=True, use_container_width=True)
-                st.markdown("#### Bar")
-                st.dataframe(record["Bar"], hide_index=True, use_container_width=True)
-                st.markdown("#### Machine")
-                st.dataframe(record["Machine"], hide_index=True, use_container_width=True)
-                st.markdown("#### Debts")
-                st.dataframe(record["Debts"], hide_index=True, use_container_width=True)
-
-    else:
+    def close_onclick(session):
+        st.session_state.history_open.discard(session)
+
+    # Load only the session headers (newest first)
+    sessions = load_history_sessions(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file)
+
+    if sessions.empty:
         st.write("No history records found.")
+        return
+
+    # Pagination
+    num_pages = max(1, math.ceil(len(sessions) / PAGE_SIZE))
+    st.session_state.history_page = min(st.session_state.history_page, num_pages)
+    if num_pages > 1:
+        st.number_input(f"Page (of {num_pages})", min_value=1, max_value=num_pages, step=1, key="history_page")
+    page = st.session_state.history_page
+    page_sessions = sessions.iloc[(page - 1) * PAGE_SIZE : page * PAGE_SIZE]
+
+    st.caption(f"Showing {len(page_sessions)} of {len(sessions)} sessions")
+
+    # Display history in reverse chronological order
+    for session, name, price in zip(page_sessions["Session"], page_sessions["WhoPaid"], page_sessions["TotalPaid"]):
+        # Format the date for display
+        formatted_date = format_date(session)
+        is_open = session in st.session_state.history_open
+
+        # Show data (the session body is only read once it has been opened)
+        with st.expander(f"{formatted_date} · {name} paid {price:.2f} €", expanded=is_open):
+            if not is_open:
+                st.button("Show details", key=f"history_open_{session}", on_click=open_onclick, args=(session,))
+                continue
+
+            record = load_history_session(history_dir, session, whopaid_file, order_file, bar_file, machine_file, debts_file)
+            st.markdown("#### Who Paid")
+            name, price = record["Whopaid"]
+            st.write(f"**{name} paid {price:.2f} €**")
+            st.markdown("#### Order")
+            st.dataframe(record["Order"], hide_index=True, use_container_width=True)
+            st.markdown("#### Bar")
+            st.dataframe(record["Bar"], hide_index=True, use_container_width=True)
+            st.markdown("#### Machine")
+            st.dataframe(record["Machine"], hide_index=True, use_container_width=True)
+            st.markdown("#### Debts")
+            st.dataframe(record["Debts"], hide_index=True, use_container_width=True)
+            st.button("Hide details", key=f"history_close_{session}", on_click=close_onclick, args=(session,))
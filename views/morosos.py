@@ -1,25 +1,68 @@
 import streamlit as st
-import os
-from utils import load_csv
+from utils import load_balances, asset_manifest, image_thumbnail, compressed_audio
+
+
+# Debtors whose assets are loaded right away, the rest are loaded when opened
+EAGER_DEBTORS = 3
+
+
+def show_assets(debtor, assets, symbol, cache_dir):
+    """Nickname, image, backstory and audio of a debtor, from their asset manifest entry. Image and audio come from the asset cache."""
+    # Debtor's nickname
+    if assets["nickname"] is not None:
+        st.subheader(f"{symbol}{debtor}, {assets['nickname']}")
+    else:
+        st.subheader(f"{symbol}{debtor}")
+
+    # Display generated image (downscaled to the column width)
+    if assets["image"] is not None:
+        st.image(image_thumbnail(assets["image"], cache_dir), use_container_width=True)
+    else:
+        st.info("🖼️ Image not available")
+
+    # Display backstory
+    if assets["backstory"] is not None:
+        st.markdown(assets["backstory"])
+    else:
+        st.info("📝 Backstory not available")
+
+    # Display audio player (compressed if ffmpeg is available, Streamlit still reads the whole file into memory)
+    if assets["speech"] is not None:
+        audio_path, audio_format = compressed_audio(assets["speech"], cache_dir)
+        st.audio(audio_path, format=audio_format)
 
 
 # TODO: As of now, the backstories are generated everyday in Atenea, and these are send to Hiperion.
 #   The project generating the backstories is located at "/home/mrt/Projects/pix2pix". The project also contains a users.yaml file with user data to generate the backstories.
-def morosos(last_file):
+def morosos(last_file, backstories_dir, asset_cache_dir):
     st.title("Morosos 👻")
 
     # Check if user moved to other view
     if st.session_state.state != "Morosos":
         st.session_state.state = "Morosos"
+        st.session_state.morosos_open = set()
+
+    # Initialize state
+    if "morosos_open" not in st.session_state:
+        st.session_state.morosos_open = set()
+
+    # On click events
+    def open_onclick(debtor):
+        st.session_state.morosos_open.add(debtor)
+
+    def close_onclick(debtor):
+        st.session_state.morosos_open.discard(debtor)
+
+    # One scan of the backstories directory, repeated only when it changes
+    manifest = asset_manifest(backstories_dir)
 
     # Sort by debt
-    debts_data = load_csv(last_file)
+    debts_data = load_balances(last_file)
     sorted_debts = debts_data.sort_values(by="Debt", ascending=False).reset_index(drop=True)
 
     # Display generated images and backstories for all debtors
     for i in range(len(sorted_debts)):
         debtor = sorted_debts.loc[i, "Name"]
-        debtor_dir = f"/home/mrt/Projects/pix2pix/backstories/{debtor}"
 
         # Display debtor name with medals for top 3
         if i == 0:
@@ -31,49 +74,30 @@ def morosos(last_file):
         else:
             symbol = f"{i + 1} - "
 
+        # Only the top debtors are loaded eagerly, the rest when opened
+        is_open = i < EAGER_DEBTORS or debtor in st.session_state.morosos_open
+        if not is_open:
+            st.subheader(f"{symbol}{debtor}")
+            st.button("Show story", key=f"morosos_open_{debtor}", on_click=open_onclick, args=(debtor,))
+            st.divider()
+            continue
+
         # Check if the debtor's assets exist in the pix2pix project
-        if not os.path.exists(debtor_dir):
+        assets = manifest.get(debtor)
+        if assets is None:
             st.subheader(f"{symbol}{debtor}")
-            st.warning(f"⚠️ Assets for **{debtor}** are not available yet. Please add this user to the pix2pix project in **Atenea** at `/home/mrt/Projects/pix2pix`.")
+            st.warning(f"⚠️ Assets for **{debtor}** are not available yet. Please add this user to the pix2pix project in **Atenea** at `/home/mrt/Projects/pix2pix` (backstories are read from `{backstories_dir}`).")
             st.divider()
             continue
 
         # Try to load and display the debtor's assets
         try:
-            # Obtain debtor's nickname
-            nickname_file = f"{debtor_dir}/nickname.txt"
-            if os.path.exists(nickname_file):
-                with open(nickname_file, "r") as f:
-                    nickname = f.read()
-                st.subheader(f"{symbol}{debtor}, {nickname}")
-            else:
-                st.subheader(f"{symbol}{debtor}")
-
-            # Display generated image
-            image_file = f"{debtor_dir}/image.png"
-            if os.path.exists(image_file):
-                st.image(image_file, use_container_width=True)
-            else:
-                st.info("🖼️ Image not available")
-
-            # Display backstory
-            backstory_file = f"{debtor_dir}/backstory.txt"
-            if os.path.exists(backstory_file):
-                with open(backstory_file, "r") as f:
-                    prompt = f.read()
-                st.markdown(prompt)
-            else:
-                st.info("📝 Backstory not available")
-
-            # Display audio player
-            audio_file_path = f"{debtor_dir}/speech.wav"
-            if os.path.exists(audio_file_path):
-                with open(audio_file_path, "rb") as audio_file:
-                    audio_bytes = audio_file.read()
-                st.audio(audio_bytes, format="audio/wav")
-
+            show_assets(debtor, assets, symbol, asset_cache_dir)
         except Exception as e:
             st.error(f"❌ Error loading assets for **{debtor}**: {str(e)}")
             st.info(f"💡 Please ensure this user is properly set up in the pix2pix project in **Atenea**.")
 
+        if i >= EAGER_DEBTORS:
+            st.button("Hide story", key=f"morosos_close_{debtor}", on_click=close_onclick, args=(debtor,))
+
         st.divider()
@@ -1,6 +1,6 @@
 import pandas as pd
 import streamlit as st
-from utils import save_order, add_user, load_users, load_active_users, load_hidden_users, toggle_user_status
+from utils import save_order, add_user, load_users, load_active_users, load_user_registry, set_user_statuses
 
 
 def poll(order_file, users_file, last_file):
@@ -32,41 +32,23 @@ def poll(order_file, users_file, last_file):
     with st.expander("👁️ Manage Hidden Users"):
         st.markdown("**Hide inactive users** to keep the participant list short. Hidden users can still be unhidden later.")
 
+        registry = load_user_registry(users_file)
         col1, col2 = st.columns(2)
-
         with col1:
-            st.subheader("Active Users")
-            active_users = load_active_users(users_file)
-
-            if active_users:
-                for user in active_users:
-                    col_user, col_btn = st.columns([3, 1])
-                    with col_user:
-                        st.write(user)
-                    with col_btn:
-                        if st.button("Hide", key=f"hide_{user}"):
-                            toggle_user_status(users_file, user, "hidden")
-                            st.session_state.users = load_users(users_file)
-                            st.rerun()
-            else:
-                st.info("No active users")
-
+            to_hide = st.multiselect("Active users to hide", registry.active, placeholder="Select users", key="poll_to_hide")
         with col2:
-            st.subheader("Hidden Users")
-            hidden_users = load_hidden_users(users_file)
-
-            if hidden_users:
-                for user in hidden_users:
-                    col_user, col_btn = st.columns([3, 1])
-                    with col_user:
-                        st.write(user)
-                    with col_btn:
-                        if st.button("Show", key=f"show_{user}"):
-                            toggle_user_status(users_file, user, "active")
-                            st.session_state.users = load_users(users_file)
-                            st.rerun()
-            else:
-                st.info("No hidden users")
+            to_show = st.multiselect("Hidden users to show", registry.hidden, placeholder="Select users", key="poll_to_show")
+
+        # Apply all selected changes with a single write
+        def apply_statuses_onclick():
+            changes = {user: "hidden" for user in to_hide}
+            changes.update({user: "active" for user in to_show})
+            set_user_statuses(users_file, changes)
+            st.session_state.users = load_users(users_file)
+            st.session_state.poll_to_hide = []
+            st.session_state.poll_to_show = []
+
+        st.button("Apply changes", disabled=not (to_hide or to_show), on_click=apply_statuses_onclick)
 
     def step1_onclick():
         st.session_state.poll_state = 0
@@ -1,49 +1,54 @@
-import os
+import time
+import logging
+import threading
 import pandas as pd
 import streamlit as st
 import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
-from collections import Counter
-from utils import load_history, load_users
-
-
-def load_statistics_data(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file):
-    """Load and process all historical data for statistics."""
-    history = load_history(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file)
-
-    # Process data into structured format
-    processed_data = []
-    accumulated_debts = []
-
-    for record in history:
-        date_str = record["Date"]
-        date_obj = datetime.strptime(date_str, "%Y-%m-%d_%H-%M-%S")
-
-        # Get who paid and price
-        whopaid_name, whopaid_price = record["Whopaid"]
-
-        # Process each order
-        for _, row in record["Order"].iterrows():
-            processed_data.append({
-                "Date": date_obj,
-                "Name": row["Name"],
-                "Drinks": row["Drinks"],
-                "Food": row["Food"],
-                "Debt": float(row["Debt"]),
-                "WhoPaid": whopaid_name,
-                "TotalPaid": whopaid_price
-            })
-
-        # Process accumulated debts from the Debts dataframe
-        for _, debt_row in record["Debts"].iterrows():
-            accumulated_debts.append({
-                "Date": date_obj,
-                "Name": debt_row["Name"],
-                "AccumulatedDebt": float(debt_row["Debt"])
-            })
-
-    return pd.DataFrame(processed_data), pd.DataFrame(accumulated_debts)
+from collections import OrderedDict
+from utils import load_statistics, statistics_cache_info, zero_fill, bucket_series, auto_resolution, RESOLUTIONS, daily_spending, user_daily_spending, daily_participation, item_popularity, user_participation, payer_totals, debt_evolution, summary
+
+
+# Figures shared by every session, least recently used first
+FIGURE_CACHE_SIZE = 256
+_figure_cache = OrderedDict()
+_figure_lock = threading.Lock()
+
+# Line charts with more points than this are drawn with WebGL and without markers
+WEBGL_POINTS = 500
+
+
+def line_options(points):
+    """px.line arguments for a chart of this many points: SVG with markers, or WebGL for large series."""
+    if points > WEBGL_POINTS:
+        return {"render_mode": "webgl", "markers": False}
+    return {"markers": True}
+
+
+def show_chart(chart_id, key, build, timings):
+    """
+    Render the figure of a chart, built by build() only if it is not cached for this key yet.
+    Returns False when build() has nothing to plot. The time spent on each chart is added to timings.
+    """
+    start = time.perf_counter()
+    cache_key = (chart_id,) + key
+    with _figure_lock:
+        fig = _figure_cache.get(cache_key, False)
+        if fig is not False:
+            _figure_cache.move_to_end(cache_key)
+    cached = fig is not False
+
+    if not cached:
+        fig = build()
+        with _figure_lock:
+            _figure_cache[cache_key] = fig
+            while len(_figure_cache) > FIGURE_CACHE_SIZE:
+                _figure_cache.popitem(last=False)
+    built = time.perf_counter()
+
+    if fig is not None:
+        st.plotly_chart(fig, use_container_width=True)
+    timings.append({"Chart": chart_id, "Cached": cached, "Build (ms)": (built - start) * 1000, "Render (ms)": (time.perf_counter() - built) * 1000})
+    return fig is not None
 
 
 def statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file, users_file):
@@ -53,31 +58,32 @@ def statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, de
     if st.session_state.state != "Statistics":
         st.session_state.state = "Statistics"
 
-    # Load all historical data
-    if "stats_data" not in st.session_state:
-        st.session_state.stats_data, st.session_state.accumulated_debts = load_statistics_data(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file)
+    # Load all historical data (shared by every session, rebuilt when a poll is closed)
+    data = load_statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, debts_file)
 
-    df = st.session_state.stats_data
-    accumulated_debts_df = st.session_state.accumulated_debts
-
-    if df.empty:
+    if data.empty:
         st.warning("No historical data available for statistics.")
         return
 
-    # Get all users
-    all_users = sorted(df["Name"].unique().tolist())
-    all_drinks = sorted([d for d in df["Drinks"].unique().tolist() if d != "Nada"])
-    all_foods = sorted([f for f in df["Food"].unique().tolist() if f != "Nada"])
+    # Get all users and items from the rollups
+    all_users = sorted(data.daily_user["Name"].unique().tolist())
+    all_drinks = sorted(data.daily_item.loc[(data.daily_item["Kind"] == "Drinks") & (data.daily_item["Item"] != "Nada"), "Item"].unique().tolist())
+    all_foods = sorted(data.daily_item.loc[(data.daily_item["Kind"] == "Food") & (data.daily_item["Item"] != "Nada"), "Item"].unique().tolist())
 
     # Filters Section
     st.header("Filters 🔍")
     col1, col2 = st.columns(2)
 
     with col1:
-        min_date = df["Date"].min().date()
-        max_date = df["Date"].max().date()
+        min_date = data.daily["Date"].min().date()
+        max_date = data.daily["Date"].max().date()
         start_date = st.date_input("Start Date", min_date, min_value=min_date, max_value=max_date)
         end_date = st.date_input("End Date", max_date, min_value=min_date, max_value=max_date)
+        resolution_choice = st.selectbox(
+            "Resolution",
+            ["Auto"] + list(RESOLUTIONS),
+            help="Time bucket of the charts over time. Auto switches to weekly or monthly buckets on long date ranges.",
+        )
 
     with col2:
         selected_users = st.multiselect("Filter by Users", all_users, default=None, placeholder="All users")
@@ -87,19 +93,26 @@ def statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, de
         with col2b:
             selected_foods = st.multiselect("Filter by Foods", all_foods, default=None, placeholder="All foods")
 
-    # Apply date filter to everything
-    date_filtered_df = df[(df["Date"].dt.date >= start_date) & (df["Date"].dt.date <= end_date)].copy()
+    # Every query below takes the same filters (user and item filters are context-aware)
+    filters = (start_date, end_date, selected_users, selected_drinks, selected_foods)
 
-    # Apply user and item filters separately for context-aware filtering
-    user_item_filtered_df = date_filtered_df.copy()
-    if selected_users:
-        user_item_filtered_df = user_item_filtered_df[user_item_filtered_df["Name"].isin(selected_users)]
-    if selected_drinks:
-        user_item_filtered_df = user_item_filtered_df[user_item_filtered_df["Drinks"].isin(selected_drinks)]
-    if selected_foods:
-        user_item_filtered_df = user_item_filtered_df[user_item_filtered_df["Food"].isin(selected_foods)]
+    # Figures are cached per history version and filters (charts that ignore some filters use a shorter key)
+    date_key = (data.version, start_date, end_date)
+    filter_key = date_key + (tuple(selected_users), tuple(selected_drinks), tuple(selected_foods))
+    timings = []
+
+    def resolution_for(series):
+        # Bucket size of a time series chart with this many lines
+        if resolution_choice == "Auto":
+            return auto_resolution(start_date, end_date, series)
+        return resolution_choice
 
-    if user_item_filtered_df.empty:
+    def resolution_title(title, resolution):
+        return title if resolution == "Daily" else f"{title} ({resolution.lower()})"
+
+    metrics = summary(data, *filters)
+
+    if metrics["orders"] == 0:
         st.warning("No data matches the selected filters.")
         return
 
@@ -120,36 +133,34 @@ def statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, de
     # 1. Spending Over Time
     st.header("💸 Spending Over Time")
 
-    if selected_drinks or selected_foods:
-        # Show spending on filtered items
-        daily_spending = user_item_filtered_df.groupby(user_item_filtered_df["Date"].dt.date)["Debt"].sum().reset_index()
-        daily_spending.columns = ["Date", "Total Spent"]
-        title = "Daily Spending on Selected Items"
-    else:
-        # Show total or user-specific spending
-        daily_spending = user_item_filtered_df.groupby(user_item_filtered_df["Date"].dt.date)["Debt"].sum().reset_index()
-        daily_spending.columns = ["Date", "Total Spent"]
-        title = "Daily Total Spending" if not selected_users else f"Daily Spending by Selected Users"
-
-    # Fill in missing dates with 0 spending
-    all_dates = pd.date_range(start=start_date, end=end_date, freq='D').date
-    daily_spending_complete = pd.DataFrame({"Date": all_dates})
-    daily_spending_complete = daily_spending_complete.merge(daily_spending, on="Date", how="left")
-    daily_spending_complete["Total Spent"] = daily_spending_complete["Total Spent"].fillna(0)
-
-    fig_spending = px.line(
-        daily_spending_complete,
-        x="Date",
-        y="Total Spent",
-        markers=True,
-        title=title
-    )
-    fig_spending.update_layout(
-        xaxis_title="Date",
-        yaxis_title="Total Spent (€)",
-        hovermode="x unified"
-    )
-    st.plotly_chart(fig_spending, use_container_width=True)
+    def build_spending():
+        # Spending on filtered items, or total / user-specific spending
+        spending = daily_spending(data, *filters)
+        if selected_drinks or selected_foods:
+            title = "Daily Spending on Selected Items"
+        else:
+            title = "Daily Total Spending" if not selected_users else f"Daily Spending by Selected Users"
+
+        # Fill in missing dates with 0 spending, then bucket long ranges
+        resolution = resolution_for(1)
+        daily_spending_complete = zero_fill(spending, start_date, end_date, "Total Spent")
+        daily_spending_complete = bucket_series(daily_spending_complete, "Total Spent", resolution)
+
+        fig_spending = px.line(
+            daily_spending_complete,
+            x="Date",
+            y="Total Spent",
+            title=resolution_title(title, resolution),
+            **line_options(len(daily_spending_complete))
+        )
+        fig_spending.update_layout(
+            xaxis_title="Date",
+            yaxis_title="Total Spent (€)",
+            hovermode="x unified"
+        )
+        return fig_spending
+
+    show_chart("spending", filter_key + (resolution_choice,), build_spending, timings)
 
     # Create consistent color mapping for selected users
     user_color_map = None
@@ -160,68 +171,64 @@ def statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, de
 
     # If specific users selected (and not too many), show individual spending
     if selected_users and len(selected_users) <= 5:
-        user_daily_spending = user_item_filtered_df.groupby([user_item_filtered_df["Date"].dt.date, "Name"])["Debt"].sum().reset_index()
-        user_daily_spending.columns = ["Date", "Name", "Total Spent"]
-
-        # Fill in missing dates with 0 spending for each user
-        all_dates = pd.date_range(start=start_date, end=end_date, freq='D').date
-        users_in_data = user_daily_spending["Name"].unique()
-
-        # Create complete date range for each user
-        complete_data = []
-        for user in users_in_data:
-            user_data = user_daily_spending[user_daily_spending["Name"] == user].copy()
-            complete_dates = pd.DataFrame({"Date": all_dates, "Name": user})
-            complete_user_data = complete_dates.merge(user_data, on=["Date", "Name"], how="left")
-            complete_user_data["Total Spent"] = complete_user_data["Total Spent"].fillna(0)
-            complete_data.append(complete_user_data)
-
-        user_daily_spending_complete = pd.concat(complete_data, ignore_index=True)
-
-        fig_user_spending = px.line(
-            user_daily_spending_complete,
-            x="Date",
-            y="Total Spent",
-            color="Name",
-            markers=True,
-            title="Individual User Spending",
-            color_discrete_map=user_color_map
-        )
-        fig_user_spending.update_layout(
-            xaxis_title="Date",
-            yaxis_title="Total Spent (€)",
-            hovermode="x unified"
-        )
-        st.plotly_chart(fig_user_spending, use_container_width=True)
+
+        def build_user_spending():
+            user_spending = user_daily_spending(data, *filters)
+
+            # Fill in missing dates with 0 spending for each user, then bucket long ranges
+            resolution = resolution_for(user_spending["Name"].nunique())
+            user_daily_spending_complete = zero_fill(user_spending, start_date, end_date, "Total Spent", key="Name")
+            user_daily_spending_complete = bucket_series(user_daily_spending_complete, "Total Spent", resolution, key="Name")
+
+            fig_user_spending = px.line(
+                user_daily_spending_complete,
+                x="Date",
+                y="Total Spent",
+                color="Name",
+                title=resolution_title("Individual User Spending", resolution),
+                color_discrete_map=user_color_map,
+                **line_options(len(user_daily_spending_complete))
+            )
+            fig_user_spending.update_layout(
+                xaxis_title="Date",
+                yaxis_title="Total Spent (€)",
+                hovermode="x unified"
+            )
+            return fig_user_spending
+
+        show_chart("user_spending", filter_key + (resolution_choice,), build_user_spending, timings)
 
     # Participation count over time
     st.subheader("👥 Participation Count Over Time")
 
-    # Count number of orders per day (each person counted per order)
-    daily_participation = user_item_filtered_df.groupby(user_item_filtered_df["Date"].dt.date).size().reset_index()
-    daily_participation.columns = ["Date", "Number of Orders"]
+    def build_participation_time():
+        # Count number of orders per day (each person counted per order), bucketed on long ranges
+        resolution = resolution_for(1)
+        participation = bucket_series(daily_participation(data, *filters), "Number of Orders", resolution)
 
-    if selected_drinks or selected_foods:
-        participation_title = "Daily Orders for Selected Items"
-    elif selected_users:
-        participation_title = "Daily Orders by Selected Users"
-    else:
-        participation_title = "Daily Participation (Total Orders)"
-
-    fig_participation_time = px.bar(
-        daily_participation,
-        x="Date",
-        y="Number of Orders",
-        title=participation_title
-    )
-    fig_participation_time.update_layout(
-        xaxis_title="Date",
-        yaxis_title="Number of Orders",
-        hovermode="x unified",
-        showlegend=False
-    )
-    fig_participation_time.update_traces(marker_color='lightblue')
-    st.plotly_chart(fig_participation_time, use_container_width=True)
+        if selected_drinks or selected_foods:
+            participation_title = "Daily Orders for Selected Items"
+        elif selected_users:
+            participation_title = "Daily Orders by Selected Users"
+        else:
+            participation_title = "Daily Participation (Total Orders)"
+
+        fig_participation_time = px.bar(
+            participation,
+            x="Date",
+            y="Number of Orders",
+            title=resolution_title(participation_title, resolution)
+        )
+        fig_participation_time.update_layout(
+            xaxis_title="Date",
+            yaxis_title="Number of Orders",
+            hovermode="x unified",
+            showlegend=False
+        )
+        fig_participation_time.update_traces(marker_color='lightblue')
+        return fig_participation_time
+
+    show_chart("participation_time", filter_key + (resolution_choice,), build_participation_time, timings)
 
     st.caption("💡 Each order is counted individually - if someone orders twice on the same day, they're counted twice")
 
@@ -234,11 +241,11 @@ def statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, de
 
     with col1:
         st.subheader("Most Popular Drinks")
-        drinks_data = user_item_filtered_df[user_item_filtered_df["Drinks"] != "Nada"]
 
-        if not drinks_data.empty:
-            drinks_count = drinks_data["Drinks"].value_counts().reset_index()
-            drinks_count.columns = ["Drink", "Count"]
+        def build_drinks():
+            drinks_count = item_popularity(data, "Drinks", *filters).rename(columns={"Item": "Drink"})
+            if drinks_count.empty:
+                return None
 
             fig_drinks = px.bar(
                 drinks_count,
@@ -250,17 +257,18 @@ def statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, de
                 color_continuous_scale="Blues"
             )
             fig_drinks.update_layout(yaxis={'categoryorder': 'total ascending'})
-            st.plotly_chart(fig_drinks, use_container_width=True)
-        else:
+            return fig_drinks
+
+        if not show_chart("drinks", filter_key, build_drinks, timings):
             st.info("No drink data for selected filters")
 
     with col2:
         st.subheader("Most Popular Foods")
-        foods_data = user_item_filtered_df[user_item_filtered_df["Food"] != "Nada"]
 
-        if not foods_data.empty:
-            foods_count = foods_data["Food"].value_counts().reset_index()
-            foods_count.columns = ["Food", "Count"]
+        def build_foods():
+            foods_count = item_popularity(data, "Food", *filters).rename(columns={"Item": "Food"})
+            if foods_count.empty:
+                return None
 
             fig_foods = px.bar(
                 foods_count,
@@ -272,8 +280,9 @@ def statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, de
                 color_continuous_scale="Greens"
             )
             fig_foods.update_layout(yaxis={'categoryorder': 'total ascending'})
-            st.plotly_chart(fig_foods, use_container_width=True)
-        else:
+            return fig_foods
+
+        if not show_chart("foods", filter_key, build_foods, timings):
             st.info("No food data for selected filters")
 
     st.divider()
@@ -291,26 +300,28 @@ def statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, de
         # Show all users' activity
         activity_title = "Overall Participation Frequency"
 
-    user_participation = user_item_filtered_df["Name"].value_counts().reset_index()
-    user_participation.columns = ["Name", "Orders"]
-
-    # Calculate height based on number of users (30px per user, minimum 400px)
-    participation_height = max(400, len(user_participation) * 30)
-
-    fig_participation = px.bar(
-        user_participation,
-        x="Orders",
-        y="Name",
-        orientation="h",
-        title=activity_title,
-        color="Orders",
-        color_continuous_scale="Purples"
-    )
-    fig_participation.update_layout(
-        yaxis={'categoryorder': 'total ascending'},
-        height=participation_height
-    )
-    st.plotly_chart(fig_participation, use_container_width=True)
+    def build_participation():
+        users_activity = user_participation(data, *filters)
+
+        # Calculate height based on number of users (30px per user, minimum 400px)
+        participation_height = max(400, len(users_activity) * 30)
+
+        fig_participation = px.bar(
+            users_activity,
+            x="Orders",
+            y="Name",
+            orientation="h",
+            title=activity_title,
+            color="Orders",
+            color_continuous_scale="Purples"
+        )
+        fig_participation.update_layout(
+            yaxis={'categoryorder': 'total ascending'},
+            height=participation_height
+        )
+        return fig_participation
+
+    show_chart("participation", filter_key, build_participation, timings)
 
     st.divider()
 
@@ -320,60 +331,60 @@ def statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, de
     if selected_users or selected_drinks or selected_foods:
         st.info("ℹ️ Payment statistics show global data (not affected by user/item filters)")
 
-    # Get unique payment records from date-filtered data only
-    payment_records = date_filtered_df.groupby(date_filtered_df["Date"].dt.date).agg({
-        "WhoPaid": "first",
-        "TotalPaid": "first"
-    }).reset_index()
+    # Times paid and total paid per person, from date-filtered data only
+    payers = payer_totals(data, start_date, end_date)
 
     col1, col2 = st.columns(2)
 
     with col1:
         st.subheader("Payment Frequency")
-        payment_freq = payment_records["WhoPaid"].value_counts().reset_index()
-        payment_freq.columns = ["Name", "Times Paid"]
+        payment_freq = payers[["Name", "Times Paid"]].sort_values("Times Paid", ascending=False)
 
-        # Calculate height based on number of payers (30px per person, minimum 400px)
-        freq_height = max(400, len(payment_freq) * 30)
+        def build_freq():
+            # Calculate height based on number of payers (30px per person, minimum 400px)
+            freq_height = max(400, len(payment_freq) * 30)
 
-        fig_freq = px.bar(
-            payment_freq,
-            x="Times Paid",
-            y="Name",
-            orientation="h",
-            title="How Many Times Each Person Paid",
-            color="Times Paid",
-            color_continuous_scale="Reds"
-        )
-        fig_freq.update_layout(
-            yaxis={'categoryorder': 'total ascending'},
-            height=freq_height
-        )
-        st.plotly_chart(fig_freq, use_container_width=True)
+            fig_freq = px.bar(
+                payment_freq,
+                x="Times Paid",
+                y="Name",
+                orientation="h",
+                title="How Many Times Each Person Paid",
+                color="Times Paid",
+                color_continuous_scale="Reds"
+            )
+            fig_freq.update_layout(
+                yaxis={'categoryorder': 'total ascending'},
+                height=freq_height
+            )
+            return fig_freq
+
+        show_chart("payment_freq", date_key, build_freq, timings)
 
     with col2:
         st.subheader("Total Amount Paid")
-        payment_total = payment_records.groupby("WhoPaid")["TotalPaid"].sum().reset_index()
-        payment_total.columns = ["Name", "Total Paid"]
-        payment_total = payment_total.sort_values("Total Paid", ascending=True)
+        payment_total = payers[["Name", "Total Paid"]].sort_values("Total Paid", ascending=True)
 
-        # Calculate height based on number of payers (30px per person, minimum 400px)
-        total_height = max(400, len(payment_total) * 30)
+        def build_total():
+            # Calculate height based on number of payers (30px per person, minimum 400px)
+            total_height = max(400, len(payment_total) * 30)
 
-        fig_total = px.bar(
-            payment_total,
-            x="Total Paid",
-            y="Name",
-            orientation="h",
-            title="Total Amount Paid by Each Person",
-            color="Total Paid",
-            color_continuous_scale="Oranges"
-        )
-        fig_total.update_layout(
-            yaxis={'categoryorder': 'total ascending'},
-            height=total_height
-        )
-        st.plotly_chart(fig_total, use_container_width=True)
+            fig_total = px.bar(
+                payment_total,
+                x="Total Paid",
+                y="Name",
+                orientation="h",
+                title="Total Amount Paid by Each Person",
+                color="Total Paid",
+                color_continuous_scale="Oranges"
+            )
+            fig_total.update_layout(
+                yaxis={'categoryorder': 'total ascending'},
+                height=total_height
+            )
+            return fig_total
+
+        show_chart("payment_total", date_key, build_total, timings)
 
     # Top Payers Podium
     st.subheader("Top Payers 🏆")
@@ -395,10 +406,7 @@ def statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, de
     st.header("📈 Accumulated Debt Evolution")
 
     # Filter accumulated debts by date range
-    debt_evolution_df = accumulated_debts_df[
-        (accumulated_debts_df["Date"].dt.date >= start_date) &
-        (accumulated_debts_df["Date"].dt.date <= end_date)
-    ].copy()
+    debt_evolution_df = debt_evolution(data, start_date, end_date).copy()
 
     if selected_users:
         # Show only selected users' debt evolution
@@ -420,26 +428,32 @@ def statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, de
     debt_evolution_df = debt_evolution_df.sort_values("Date")
 
     if not debt_evolution_df.empty:
-        # Convert date to date format for plotting
-        debt_evolution_df["Date"] = debt_evolution_df["Date"].dt.date
 
-        fig_debt_evolution = px.line(
-            debt_evolution_df,
-            x="Date",
-            y="AccumulatedDebt",
-            color="Name",
-            markers=True,
-            title="Accumulated Debt Over Time",
-            color_discrete_map=user_color_map
-        )
-        fig_debt_evolution.update_layout(
-            xaxis_title="Date",
-            yaxis_title="Accumulated Debt (€)",
-            hovermode="x unified"
-        )
-        # Add horizontal line at y=0 to show when users are in debt vs credit
-        fig_debt_evolution.add_hline(y=0, line_dash="dash", line_color="gray", opacity=0.5)
-        st.plotly_chart(fig_debt_evolution, use_container_width=True)
+        def build_debt_evolution():
+            # Convert date to date format for plotting, keeping the last balance of each bucket on long ranges
+            resolution = resolution_for(debt_evolution_df["Name"].nunique())
+            debt_evolution_df["Date"] = debt_evolution_df["Date"].dt.date
+            evolution = bucket_series(debt_evolution_df, "AccumulatedDebt", resolution, key="Name", how="last")
+
+            fig_debt_evolution = px.line(
+                evolution,
+                x="Date",
+                y="AccumulatedDebt",
+                color="Name",
+                title=resolution_title("Accumulated Debt Over Time", resolution),
+                color_discrete_map=user_color_map,
+                **line_options(len(evolution))
+            )
+            fig_debt_evolution.update_layout(
+                xaxis_title="Date",
+                yaxis_title="Accumulated Debt (€)",
+                hovermode="x unified"
+            )
+            # Add horizontal line at y=0 to show when users are in debt vs credit
+            fig_debt_evolution.add_hline(y=0, line_dash="dash", line_color="gray", opacity=0.5)
+            return fig_debt_evolution
+
+        show_chart("debt_evolution", date_key + (tuple(selected_users), resolution_choice), build_debt_evolution, timings)
 
         st.caption("💡 Positive values indicate the user owes money, negative values indicate credit/overpayment")
     else:
@@ -452,21 +466,29 @@ def statistics(history_dir, whopaid_file, order_file, bar_file, machine_file, de
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        unique_days = user_item_filtered_df["Date"].dt.date.nunique()
-        st.metric("Breakfast Sessions", unique_days)
+        st.metric("Breakfast Sessions", metrics["sessions"])
 
     with col2:
-        total_orders = len(user_item_filtered_df)
-        st.metric("Individual Orders", total_orders)
+        st.metric("Individual Orders", metrics["orders"])
 
     with col3:
-        total_spent = user_item_filtered_df["Debt"].sum()
-        st.metric("Total Spent", f"{total_spent:.2f} €")
+        st.metric("Total Spent", f"{metrics['spent']:.2f} €")
 
     with col4:
-        # Calculate average total per session
-        if unique_days > 0:
-            avg_per_session = user_item_filtered_df.groupby(user_item_filtered_df["Date"].dt.date)["Debt"].sum().mean()
-            st.metric("Avg per Session", f"{avg_per_session:.2f} €")
+        # Average total per session
+        if metrics["avg_per_session"] is not None:
+            st.metric("Avg per Session", f"{metrics['avg_per_session']:.2f} €")
         else:
             st.metric("Avg per Session", "N/A")
+
+    cache = statistics_cache_info()
+    st.caption(f"Statistics cache: {cache['hits']} hits, {cache['misses']} misses, {cache['stale']} served while rebuilding")
+
+    # Time spent on each chart in this run (cached charts only pay for rendering)
+    with st.expander("⏱️ Chart timings"):
+        timings_df = pd.DataFrame(timings)
+        st.dataframe(timings_df, hide_index=True, use_container_width=True, column_config={
+            "Build (ms)": st.column_config.NumberColumn(format="%.1f"),
+            "Render (ms)": st.column_config.NumberColumn(format="%.1f"),
+        })
+    logging.debug("Statistics chart timings: " + ", ".join(f"{t['Chart']} {t['Build (ms)'] + t['Render (ms)']:.1f} ms" for t in timings))